@@ -0,0 +1,16 @@
+"""Chargement des modules purs du module Odoo sans importer Odoo"""
+
+import importlib.util
+from pathlib import Path
+
+ADDON_DIR = Path(__file__).resolve().parent.parent / "pos_direct_print"
+
+
+def load_addon_module(relative_path, name=None):
+    """Charge un fichier du module pos_direct_print (ex: models/escpos.py)"""
+    path = ADDON_DIR / relative_path
+    name = name or "pos_direct_print_" + path.stem
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : écriture directe sur périphérique vs CUPS (lp -o raw)
+
+Un pseudo-terminal (pty) ou une FIFO joue le rôle de /dev/usb/lp0 ; un
+thread lit en continu l'autre extrémité comme le ferait l'imprimante.
+Sans --lp-printer, le chemin lp -o raw est mesuré avec le faux « lp » de
+bench_lp_stdin (coût propre à l'agent : fork/exec, sans le spouleur CUPS).
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench_device_backend
+    python -m benchmarks.bench_device_backend --fifo --jobs 500
+    python -m benchmarks.bench_device_backend --lp-printer POS80
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tty
+
+from benchmarks.bench_lp_stdin import install_stand_in_lp
+from print_server.printer import DeviceBackend, Printer
+
+
+def make_receipt(size):
+    """Ticket ESC/POS factice de `size` octets"""
+    body = (b"(1) Article de test            12 500.00 Ar\n" * (size // 42 + 1))[:size]
+    return b"\x1b@" + body + b"\x1dV\x00"
+
+
+def start_drain(fd):
+    """Lit l'extrémité « imprimante » en continu dans un thread"""
+    def _drain():
+        try:
+            while os.read(fd, 65536):
+                pass
+        except OSError:
+            pass
+
+    thread = threading.Thread(target=_drain, daemon=True)
+    thread.start()
+    return thread
+
+
+def open_pty():
+    """Crée un pty en mode brut et retourne (chemin esclave, fd maître)"""
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    return path, master, slave
+
+
+def open_fifo(directory):
+    """Crée une FIFO et retourne (chemin, fd lecteur)"""
+    path = os.path.join(directory, "lp0")
+    os.mkfifo(path)
+    reader = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    os.set_blocking(reader, True)
+    return path, reader
+
+
+def measure(send, data, jobs):
+    """Latences par travail (ms)"""
+    latencies = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        if not send(data):
+            raise RuntimeError("échec d'envoi")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    print(
+        f"{label:<28} moy {statistics.mean(latencies):8.3f} ms   "
+        f"médiane {statistics.median(latencies):8.3f} ms   "
+        f"max {max(latencies):8.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--size", type=int, default=12 * 1024, help="octets par ticket")
+    parser.add_argument("--fifo", action="store_true", help="FIFO au lieu d'un pty")
+    parser.add_argument("--lp-printer", help="file CUPS réelle (sinon faux lp)")
+    args = parser.parse_args()
+
+    data = make_receipt(args.size)
+    print(f"{args.jobs} tickets de {len(data)} octets\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fifo:
+            path, reader = open_fifo(tmp)
+            extra_fds = [reader]
+        else:
+            path, reader, slave = open_pty()
+            extra_fds = [reader, slave]
+        start_drain(reader)
+
+        # Descripteur persistant (mode "device")
+        backend = DeviceBackend(path)
+        report("device (fd persistant)", measure(backend.send, data, args.jobs))
+
+        # Réouverture à chaque ticket, pour comparaison
+        def send_reopen(payload):
+            single = DeviceBackend(path)
+            try:
+                return single.send(payload)
+            finally:
+                single.close()
+
+        report("device (open/close)", measure(send_reopen, data, args.jobs))
+        backend.close()
+
+        if not args.lp_printer:
+            install_stand_in_lp(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            printer = Printer()
+        printer.printer_name = args.lp_printer or "bench"
+        label = "CUPS (lp -o raw)" if args.lp_printer else "faux lp (lp -o raw)"
+        # Les messages de Printer sont masqués pour ne pas fausser la mesure
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = measure(printer._print_unix, data, args.jobs)
+        report(label, latencies)
+
+        for fd in extra_fds:
+            os.close(fd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : encodage des travaux texte (Printer._encode_content, print_text)
+
+Compare l'ancien encodage caractère par caractère (un appel au codec, des
+isinstance et un try/except par caractère) à l'encodage par blocs : texte
+encodé d'un seul appel, morceaux str consécutifs regroupés, bytes et octets
+int recopiés tels quels. Les deux sorties doivent être identiques.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench_encode_content --size 100000 --rounds 10
+"""
+
+import argparse
+import random
+import time
+
+from print_server.printer import Printer
+
+ENCODINGS = ["cp437", "cp858", "utf-8"]
+
+
+def legacy_encode_content(encoding, content):
+    """Implémentation d'origine, conservée comme référence"""
+    result = bytearray()
+
+    for char in content:
+        if isinstance(char, bytes):
+            result.extend(char)
+        else:
+            try:
+                result.extend(char.encode(encoding, errors="replace"))
+            except (UnicodeEncodeError, AttributeError):
+                if isinstance(char, int):
+                    result.append(char)
+                else:
+                    result.extend(str(char).encode(encoding, errors="replace"))
+
+    return bytes(result)
+
+
+def make_inputs(size, seed=0):
+    """Rapport texte (accents, euro) et suite de morceaux avec commandes ESC/POS"""
+    rng = random.Random(seed)
+    words = ["Total", "Caisse", "Remise", "Espèces", "Crédit", "5,00 €", "Qté", "TVA 20%"]
+    text = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(words) for _ in range(6)) + "\n"
+        text.append(line)
+        length += len(line)
+    text = "".join(text)[:size]
+
+    chunks = []
+    length = 0
+    while length < size:
+        line = " ".join(rng.choice(words) for _ in range(6)) + "\n"
+        chunks += [b"\x1bE\x01", line[:12], b"\x1bE\x00", line[12:], 0x0A]
+        length += len(line) + 7
+    return [("texte", text), ("morceaux", chunks), ("bytes", text.encode("utf-8")[:size])]
+
+
+def timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - start) * 1000 / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=100_000, help="Caractères par travail")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'codage':>7} {'entrée':>9} {'octets':>8} {'avant (ms)':>12} {'après (ms)':>12} {'gain':>8}")
+    for encoding in ENCODINGS:
+        # Mode "device" : pas de détection d'imprimante ni d'accès au périphérique
+        printer = Printer(encoding=encoding, backend="device", device="/dev/null")
+        for label, content in make_inputs(args.size):
+            before, expected = timeit(
+                lambda: legacy_encode_content(encoding, content), args.rounds
+            )
+            after, result = timeit(lambda: printer._encode_content(content), args.rounds)
+            assert result == expected, f"sortie différente ({encoding}, {label})"
+            print(
+                f"{encoding:>7} {label:>9} {len(result):>8} {before:12.3f} "
+                f"{after:12.3f} {before / after:7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
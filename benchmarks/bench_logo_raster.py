@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : conversion du logo en raster ESC/POS (GS v 0)
+
+Compare l'ancienne conversion (liste Python des pixels + triple boucle de
+compactage des bits) à convert_image_to_raster, qui s'appuie sur le mode
+"1" natif de PIL (tobytes). Les deux sorties doivent être identiques.
+
+Usage (depuis la racine du dépôt, Pillow requis) :
+    python -m benchmarks.bench_logo_raster --rounds 20
+"""
+
+import argparse
+import io
+import random
+import time
+
+from PIL import Image
+
+from benchmarks._loader import load_addon_module
+
+escpos = load_addon_module("models/escpos.py")
+
+# Tailles de logos typiques (pixels) : source -> raster max 384 points
+LOGO_SIZES = [(200, 80), (384, 120), (384, 200), (512, 512), (1024, 400)]
+
+
+def legacy_convert_image_to_raster(image_binary, max_width=384):
+    """Implémentation d'origine, conservée comme référence"""
+    img = Image.open(io.BytesIO(image_binary))
+    img = img.convert("L")
+    if img.width > max_width:
+        ratio = max_width / img.width
+        new_height = int(img.height * ratio)
+        img = img.resize((max_width, new_height), Image.LANCZOS)
+    img = img.point(lambda x: 0 if x < 128 else 255, "1")
+    width = img.width
+    height = img.height
+    width_bytes = (width + 7) // 8
+    pixels = list(img.getdata())
+    data = bytearray()
+    for y in range(height):
+        for x_byte in range(width_bytes):
+            byte = 0
+            for bit in range(8):
+                x = x_byte * 8 + bit
+                if x < width:
+                    pixel_index = y * width + x
+                    if pixel_index < len(pixels) and pixels[pixel_index] == 0:
+                        byte |= 1 << (7 - bit)
+            data.append(byte)
+    return bytes(data), width_bytes, height
+
+
+def make_logo(width, height, seed=0):
+    """Logo PNG factice : dégradé + bruit (pire cas pour le seuillage)"""
+    rng = random.Random(seed)
+    pixels = bytes(
+        (x * 255 // max(width - 1, 1) + rng.randrange(-40, 40)) % 256
+        for y in range(height)
+        for x in range(width)
+    )
+    buffer = io.BytesIO()
+    Image.frombytes("L", (width, height), pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def timeit(func, arg, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func(arg)
+    return (time.perf_counter() - start) * 1000 / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'logo':>10} {'raster':>10} {'avant (ms)':>12} {'après (ms)':>12} {'gain':>8}")
+    for width, height in LOGO_SIZES:
+        logo = make_logo(width, height)
+        before, expected = timeit(legacy_convert_image_to_raster, logo, args.rounds)
+        after, result = timeit(escpos.convert_image_to_raster, logo, args.rounds)
+        assert result == expected, f"sortie différente pour {width}x{height}"
+        raster = f"{result[1] * 8}x{result[2]}"
+        print(
+            f"{width:>4}x{height:<5} {raster:>10} {before:12.3f} {after:12.3f} "
+            f"{before / after:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
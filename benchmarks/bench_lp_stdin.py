@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : envoi CUPS par le stdin de lp vs fichier temporaire
+
+Mesure la latence par ticket des deux chemins de Printer :
+  - _print_unix      : octets transmis sur l'entrée standard de lp
+  - _print_unix_file : fichier temporaire + lp <fichier> + suppression
+
+Sans --lp-printer, un faux « lp » (script qui lit son entrée et la jette)
+est placé en tête du PATH : on mesure alors uniquement le coût propre à
+l'agent (fichier temporaire, fork/exec), sans le spouleur CUPS.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench_lp_stdin
+    python -m benchmarks.bench_lp_stdin --lp-printer POS80 --jobs 50
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from print_server.printer import Printer
+
+STAND_IN_LP = """#!/bin/sh
+for last; do :; done
+if [ -f "$last" ]; then cat "$last"; else cat; fi > /dev/null
+"""
+
+
+def install_stand_in_lp(directory):
+    """Place le faux lp dans `directory`, en tête du PATH"""
+    lp = os.path.join(directory, "lp")
+    with open(lp, "w") as f:
+        f.write(STAND_IN_LP)
+    os.chmod(lp, 0o755)
+    os.environ["PATH"] = directory + os.pathsep + os.environ["PATH"]
+
+
+def measure(send, data, jobs):
+    latencies = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        # Les messages de Printer sont masqués pour ne pas fausser la mesure
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = send(data)
+        if not ok:
+            raise RuntimeError("échec d'envoi")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    print(
+        f"{label:<22} moy {statistics.mean(latencies):7.3f} ms   "
+        f"médiane {statistics.median(latencies):7.3f} ms   "
+        f"p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1]:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--size", type=int, default=12 * 1024, help="octets par ticket")
+    parser.add_argument("--lp-printer", help="file CUPS réelle (sinon faux lp)")
+    args = parser.parse_args()
+
+    data = b"\x1b@" + b"x" * args.size + b"\x1dV\x00"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.lp_printer:
+            install_stand_in_lp(tmp)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            printer = Printer()
+        printer.printer_name = args.lp_printer or "bench"
+
+        print(f"{args.jobs} tickets de {len(data)} octets "
+              f"({'CUPS: ' + args.lp_printer if args.lp_printer else 'faux lp'})\n")
+        report("lp + stdin", measure(printer._print_unix, data, args.jobs))
+        report("lp + fichier temp.", measure(printer._print_unix_file, data, args.jobs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : imprimante réseau TCP 9100, connexion persistante vs une connexion par ticket
+
+Un serveur asyncio local joue le rôle de l'imprimante (il compte les
+octets et les connexions reçus). Le scénario vérifie aussi que les
+travaux successifs partagent la même connexion et que le backend se
+reconnecte après une coupure côté imprimante.
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench_network_backend --jobs 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from print_server.printer import NetworkBackend
+
+
+class FakePrinter:
+    """Serveur TCP asyncio qui simule une imprimante JetDirect"""
+
+    def __init__(self):
+        self.received = 0
+        self.connections = 0
+        self.port = None
+        self._writers = set()
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, "127.0.0.1", 0)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                self.received += len(chunk)
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def drop_connections(self):
+        """Ferme toutes les connexions (imprimante éteinte/rallumée)"""
+        def _drop():
+            for writer in list(self._writers):
+                writer.close()
+        self._loop.call_soon_threadsafe(_drop)
+        time.sleep(0.1)
+
+    def wait_for(self, total, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.received < total and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.received >= total
+
+
+def measure(send, data, jobs):
+    latencies = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        if not send(data):
+            raise RuntimeError("échec d'envoi")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies, connections):
+    print(
+        f"{label:<26} moy {statistics.mean(latencies):7.3f} ms   "
+        f"médiane {statistics.median(latencies):7.3f} ms   "
+        f"connexions {connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--size", type=int, default=12 * 1024, help="octets par ticket")
+    args = parser.parse_args()
+
+    data = b"\x1b@" + b"x" * args.size + b"\x1dV\x00"
+    printer = FakePrinter()
+    address = f"127.0.0.1:{printer.port}"
+    print(f"{args.jobs} tickets de {len(data)} octets vers {address}\n")
+
+    # Connexion persistante : tous les travaux sur le même socket
+    backend = NetworkBackend(address)
+    before = printer.connections
+    latencies = measure(backend.send, data, args.jobs)
+    assert printer.wait_for(args.jobs * len(data)), "octets manquants"
+    report("persistante", latencies, printer.connections - before)
+
+    # Coupure côté imprimante : le travail suivant doit se reconnecter
+    printer.drop_connections()
+    expected = printer.received + len(data)
+    assert backend.send(data) and printer.wait_for(expected), "reconnexion échouée"
+    print("reconnexion après coupure  OK")
+    backend.close()
+
+    # Une connexion par ticket, pour comparaison
+    def send_once(payload):
+        single = NetworkBackend(address)
+        try:
+            return single.send(payload)
+        finally:
+            single.close()
+
+    before = printer.connections
+    expected = printer.received + args.jobs * len(data)
+    latencies = measure(send_once, data, args.jobs)
+    assert printer.wait_for(expected), "octets manquants"
+    report("une connexion par ticket", latencies, printer.connections - before)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : assemblage du corps du ticket (lignes, totaux, taxes, paiements)
+
+Compare les anciens helpers en fermetures (to_bytes, add, cmd, table_row,
+separator, format_money : chaînes ré-encodées à chaque appel, colonnes
+recalculées à chaque ligne) à ReceiptBuilder (commandes pré-encodées,
+colonnes et formateurs en cache, segments joints une seule fois).
+Les commandes factices reprennent la structure de pos.order sans l'ORM ;
+les deux sorties doivent être identiques, octet pour octet, pour chaque
+page de code de ENCODINGS (commandes comprises : tiroir-caisse, code-barres).
+
+Usage (depuis la racine du dépôt) :
+    python -m benchmarks.bench_receipt_builder --rounds 200
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from benchmarks._loader import load_addon_module
+
+escpos = load_addon_module("models/escpos.py")
+
+ORDER_SIZES = [10, 50, 200]
+WIDTH = 42
+ENCODING = "cp437"
+# Pages de code vérifiées (paramètres de commandes > 0x7F compris)
+ENCODINGS = ["cp437", "cp850", "cp858", "cp1252", "utf-8"]
+
+
+def make_order(n_lines, seed=0):
+    """Commande factice : lignes, taxes et paiements"""
+    rng = random.Random(seed)
+    lines = [
+        SimpleNamespace(
+            qty=rng.randint(1, 5),
+            name=f"Produit {rng.randint(100, 999)} édition spéciale",
+            subtotal=0 if rng.random() < 0.05 else rng.uniform(1000, 200000),
+            discount=rng.choice([0, 0, 0, 10, 15]),
+        )
+        for _ in range(n_lines)
+    ]
+    total = sum(line.subtotal for line in lines)
+    return SimpleNamespace(
+        lines=lines,
+        total=total,
+        taxes=[{"rate": 20, "base": total / 1.2, "amount": total / 6, "total": total}],
+        payments=[("Carte bancaire", total * 0.6), ("Espèces", total * 0.4 + 500)],
+    )
+
+
+def render_legacy(order, encoding=ENCODING):
+    """Implémentation d'origine (fermetures), conservée comme référence"""
+    width = WIDTH
+    output = bytearray()
+
+    def to_bytes(text):
+        if isinstance(text, bytes):
+            return text
+        return str(text).encode(encoding, errors="replace")
+
+    def add(text):
+        output.extend(to_bytes(text))
+        output.extend(b"\n")
+
+    def cmd(c):
+        if isinstance(c, bytes):
+            output.extend(c)
+        else:
+            output.extend(to_bytes(c))
+
+    def table_row(columns):
+        result = ""
+        remaining = width
+        for i, col in enumerate(columns):
+            text = str(col.get("text", ""))
+            width_ratio = col.get("width", 0.5)
+            align = col.get("align", "left")
+            col_width = int(width * width_ratio)
+            if i == len(columns) - 1:
+                col_width = remaining
+            remaining -= col_width
+            if len(text) > col_width:
+                text = text[: col_width - 1] + "."
+            if align == "right":
+                text = text.rjust(col_width)
+            elif align == "center":
+                text = text.center(col_width)
+            else:
+                text = text.ljust(col_width)
+            result += text
+        return result
+
+    def separator(char="-"):
+        return char * width
+
+    def format_money(amount, symbol=None, position=None):
+        sym = symbol or "Ar"
+        pos = position or "after"
+        try:
+            amount_str = f"{float(amount):,.2f}".replace(",", " ")
+        except (ValueError, TypeError):
+            amount_str = "0.00"
+        if pos == "before":
+            return f"{sym}{amount_str}"
+        return f"{amount_str} {sym}"
+
+    add("Date : 17/10/2026 12:34")
+    add(separator())
+    cmd(escpos.BOLD_ON)
+    add(table_row([
+        {"text": "ARTICLES", "width": 0.55, "align": "left"},
+        {"text": "Totals TTC", "width": 0.25, "align": "right"},
+    ]))
+    cmd(escpos.BOLD_OFF)
+    for line in order.lines:
+        cmd(escpos.BOLD_ON)
+        amount = "*OFFERT" if line.subtotal == 0 else format_money(line.subtotal)
+        add(table_row([
+            {"text": f"({line.qty}) {line.name}", "width": 0.65, "align": "left"},
+            {"text": amount, "width": 0.35, "align": "right"},
+        ]))
+        cmd(escpos.BOLD_OFF)
+        if line.discount:
+            add(f"   Remise {line.discount:.0f}% (-{format_money(line.subtotal * line.discount / 100)})")
+        add("")
+    add(separator())
+    cmd(escpos.BOLD_ON)
+    add(table_row([
+        {"text": f"TOTAL A PAYER ({len(order.lines)})", "width": 0.55, "align": "left"},
+        {"text": format_money(order.total), "width": 0.25, "align": "right"},
+    ]))
+    cmd(escpos.BOLD_OFF)
+    add(table_row([
+        {"text": "TAUX", "width": 0.25, "align": "center"},
+        {"text": "HT", "width": 0.25, "align": "right"},
+        {"text": "TVA", "width": 0.25, "align": "right"},
+        {"text": "TTC", "width": 0.25, "align": "right"},
+    ]))
+    add(separator())
+    for tax in order.taxes:
+        add(table_row([
+            {"text": f"{tax['rate']:.0f}%", "width": 0.25, "align": "center"},
+            {"text": format_money(tax["base"]), "width": 0.25, "align": "right"},
+            {"text": format_money(tax["amount"]), "width": 0.25, "align": "right"},
+            {"text": format_money(tax["total"]), "width": 0.25, "align": "right"},
+        ]))
+    add("Encaissement:")
+    for method, amount in order.payments:
+        add(table_row([
+            {"text": method, "width": 0.6, "align": "left"},
+            {"text": format_money(amount), "width": 0.4, "align": "right"},
+        ]))
+    cmd(escpos.ALIGN_CENTER)
+    cmd(escpos.barcode_ean13("2000000001234"))
+    cmd(escpos.ALIGN_LEFT)
+    cmd(escpos.OPEN_CASH_DRAWER)
+    return bytes(output)
+
+
+def render_builder(order, encoding=ENCODING):
+    """Même ticket avec ReceiptBuilder (voir pos.order._iter_escpos_receipt)"""
+    receipt = escpos.ReceiptBuilder(WIDTH, encoding)
+    add, cmd, row, format_money = receipt.line, receipt.command, receipt.row, receipt.money
+    bold_on, bold_off = receipt.BOLD_ON, receipt.BOLD_OFF
+
+    add("Date : 17/10/2026 12:34")
+    receipt.separator()
+    cmd(bold_on)
+    row(("ARTICLES", "Totals TTC"), escpos.COLUMNS_TOTAL)
+    cmd(bold_off)
+    for line in order.lines:
+        cmd(bold_on)
+        amount = "*OFFERT" if line.subtotal == 0 else format_money(line.subtotal)
+        row((f"({line.qty}) {line.name}", amount), escpos.COLUMNS_PRODUCT)
+        cmd(bold_off)
+        if line.discount:
+            add(f"   Remise {line.discount:.0f}% (-{format_money(line.subtotal * line.discount / 100)})")
+        add("")
+    receipt.separator()
+    cmd(bold_on)
+    row((f"TOTAL A PAYER ({len(order.lines)})", format_money(order.total)), escpos.COLUMNS_TOTAL)
+    cmd(bold_off)
+    row(("TAUX", "HT", "TVA", "TTC"), escpos.COLUMNS_TAX)
+    receipt.separator()
+    for tax in order.taxes:
+        row(
+            (
+                f"{tax['rate']:.0f}%",
+                format_money(tax["base"]),
+                format_money(tax["amount"]),
+                format_money(tax["total"]),
+            ),
+            escpos.COLUMNS_TAX,
+        )
+    add("Encaissement:")
+    for method, amount in order.payments:
+        row((method, format_money(amount)), escpos.COLUMNS_PAYMENT)
+    cmd(receipt.ALIGN_CENTER)
+    cmd(escpos.barcode_ean13("2000000001234"))
+    cmd(receipt.ALIGN_LEFT)
+    cmd(receipt.OPEN_CASH_DRAWER)
+    return receipt.section()
+
+
+def timeit(func, arg, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func(arg)
+    return (time.perf_counter() - start) * 1000 / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=100)
+    args = parser.parse_args()
+
+    order = make_order(ORDER_SIZES[0])
+    for encoding in ENCODINGS:
+        assert render_builder(order, encoding) == render_legacy(order, encoding), (
+            f"sortie différente en {encoding}"
+        )
+    print(f"Sorties identiques pour : {', '.join(ENCODINGS)}\n")
+
+    print(f"{'lignes':>7} {'octets':>8} {'avant (ms)':>12} {'après (ms)':>12} {'gain':>8}")
+    for n_lines in ORDER_SIZES:
+        order = make_order(n_lines)
+        before, expected = timeit(render_legacy, order, args.rounds)
+        after, result = timeit(render_builder, order, args.rounds)
+        assert result == expected, f"sortie différente pour {n_lines} lignes"
+        print(
+            f"{n_lines:>7} {len(result):>8} {before:12.3f} {after:12.3f} "
+            f"{before / after:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK : compression des tickets transférés d'Odoo vers l'agent
+
+Mesure, pour un ticket sans logo, avec un logo simple (aplats) et avec un
+logo bruité (pire cas), la taille transférée et le temps de compression /
+décompression de chaque codage proposé par le contrôleur (gzip, deflate,
+zstd si le module zstandard est installé).
+
+Les temps de compression et de décompression sont mesurés. La latence de
+transfert n'est pas mesurée : elle est estimée (colonnes « est. ») pour
+quelques liaisons WAN typiques à partir de ces temps et de la taille :
+    latence estimée = compression + RTT + taille / débit + décompression
+
+Usage (depuis la racine du dépôt, Pillow requis) :
+    python -m benchmarks.bench_receipt_compression --rounds 50
+"""
+
+import argparse
+import io
+import random
+import time
+import zlib
+
+from PIL import Image, ImageDraw
+
+from benchmarks._loader import load_addon_module
+
+escpos = load_addon_module("models/escpos.py")
+compression = load_addon_module("controllers/compression.py")
+
+# Liaisons magasin <-> Odoo hébergé : (nom, débit en Mbit/s, RTT en ms)
+LINKS = [("ADSL 1 Mbit/s", 1, 60), ("4G 5 Mbit/s", 5, 50), ("Fibre 50 Mbit/s", 50, 20)]
+
+
+def make_receipt_text(lines=25, width=42):
+    """Corps texte d'un ticket (articles, totaux, paiements)"""
+    rng = random.Random(0)
+    out = [escpos.INIT_PRINTER, escpos.ALIGN_CENTER, "MA BOUTIQUE\n", escpos.ALIGN_LEFT]
+    out.append("Date : 17/10/2026 12:34\nCaisse : Caisse 1 (ID:1)\n" + "-" * width + "\n")
+    for _ in range(lines):
+        name = f"({rng.randint(1, 5)}) Produit {rng.randint(100, 999)}"
+        price = f"{rng.uniform(1, 200):,.2f} Ar".replace(",", " ")
+        out.append(escpos.BOLD_ON + name.ljust(width - len(price)) + price + "\n")
+        out.append(escpos.BOLD_OFF + "\n")
+    out.append("-" * width + "\nTOTAL A PAYER".ljust(width - 12) + "1 234.00 Ar\n")
+    out.append("Merci de votre visite !\n" + escpos.feed(3) + escpos.CUT_PAPER)
+    return "".join(out).encode("cp437", errors="replace")
+
+
+def make_logo(noisy):
+    """Logo PNG 384 px : aplats et texte, ou bruit (pire cas)"""
+    width, height = 384, 160
+    if noisy:
+        rng = random.Random(1)
+        img = Image.frombytes("L", (width, height), rng.randbytes(width * height))
+    else:
+        img = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((10, 10, 150, 150), fill=0)
+        draw.rectangle((170, 40, 370, 70), fill=0)
+        draw.rectangle((170, 90, 330, 110), fill=60)
+        draw.text((180, 120), "MA BOUTIQUE", fill=0)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    raster = escpos.convert_image_to_raster(buffer.getvalue())
+    return escpos.print_raster_image(*raster)
+
+
+def decompress(data, encoding):
+    if encoding == "zstd":
+        return compression.zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return zlib.decompress(data, 31 if encoding == "gzip" else 15)
+
+
+def timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - start) * 1000 / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    text = make_receipt_text()
+    receipts = [
+        ("sans logo", text),
+        ("logo simple", make_logo(noisy=False) + text),
+        ("logo bruité", make_logo(noisy=True) + text),
+    ]
+    encodings = [None] + compression.SUPPORTED_ENCODINGS
+
+    for label, receipt in receipts:
+        print(f"\n=== Ticket {label} : {len(receipt)} octets ===")
+        header = f"{'codage':>9} {'taille':>8} {'ratio':>7} {'comp. ms':>9} {'décomp. ms':>11}"
+        print(header + "".join(f" {name + ' est.':>21}" for name, _, _ in LINKS))
+        for encoding in encodings:
+            if encoding is None:
+                size, comp_ms, decomp_ms = len(receipt), 0.0, 0.0
+            else:
+                comp_ms, body = timeit(
+                    lambda: compression.compress(receipt, encoding), args.rounds
+                )
+                decomp_ms, decoded = timeit(lambda: decompress(body, encoding), args.rounds)
+                assert decoded == receipt, f"décompression {encoding} incorrecte"
+                size = len(body)
+            latencies = "".join(
+                f" {comp_ms + rtt + size * 8 / (mbps * 1000) + decomp_ms:18.1f} ms"
+                for _, mbps, rtt in LINKS
+            )
+            print(
+                f"{encoding or 'aucun':>9} {size:>8} {len(receipt) / size:6.1f}x "
+                f"{comp_ms:9.3f} {decomp_ms:11.3f}{latencies}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Compression HTTP des tickets (négociée via Accept-Encoding).
+
+Module sans dépendance à Odoo : utilisé par le contrôleur et par les
+benchmarks. Le raster du logo (GS v 0) se compresse très bien ; le texte
+du ticket un peu moins.
+"""
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codages proposés, par ordre de préférence à qualité égale côté client
+SUPPORTED_ENCODINGS = (["zstd"] if zstandard else []) + ["gzip", "deflate"]
+
+# En dessous de cette taille, la compression ne fait rien gagner
+MIN_COMPRESS_SIZE = 256
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Meilleur codage accepté par le client (objet Accept de werkzeug),
+    ou None pour une réponse non compressée.
+    """
+    return accept_encodings.best_match(SUPPORTED_ENCODINGS) or None
+
+
+class _ZlibStream:
+    """gzip (wbits=31) ou deflate au format zlib (wbits=15)"""
+
+    __slots__ = ("_obj",)
+
+    def __init__(self, wbits):
+        self._obj = zlib.compressobj(6, zlib.DEFLATED, wbits)
+
+    def compress(self, data, flush=False):
+        out = self._obj.compress(data)
+        if flush:
+            out += self._obj.flush(zlib.Z_SYNC_FLUSH)
+        return out
+
+    def finish(self):
+        return self._obj.flush()
+
+
+class _ZstdStream:
+    __slots__ = ("_obj",)
+
+    def __init__(self):
+        self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data, flush=False):
+        out = self._obj.compress(data)
+        if flush:
+            out += self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return out
+
+    def finish(self):
+        return self._obj.flush()
+
+
+def compressor(encoding):
+    """Compresseur en flux pour un codage de SUPPORTED_ENCODINGS"""
+    if encoding == "zstd":
+        return _ZstdStream()
+    return _ZlibStream(31 if encoding == "gzip" else 15)
+
+
+def compress(data, encoding):
+    """Compresse une réponse complète"""
+    stream = compressor(encoding)
+    return stream.compress(data) + stream.finish()
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compresse une réponse envoyée par morceaux. Chaque morceau est vidé
+    (sync flush) : le client peut le décoder et l'imprimer sans attendre
+    la suite.
+    """
+    stream = compressor(encoding)
+    try:
+        for chunk in chunks:
+            out = stream.compress(chunk, flush=True)
+            if out:
+                yield out
+        yield stream.finish()
+    finally:
+        # Libère au plus tôt le générateur source (curseur du rendu)
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -1,7 +1,23 @@
 # -*- coding: utf-8 -*-
-from odoo import http
+from odoo import http, api, SUPERUSER_ID
 from odoo.http import request, Response
+from odoo.modules.module import get_manifest
+from odoo.modules.registry import Registry
 import json
+import logging
+import struct
+
+from .compression import (
+    MIN_COMPRESS_SIZE,
+    compress,
+    compress_stream,
+    negotiate_encoding,
+)
+
+_logger = logging.getLogger(__name__)
+
+# Nombre max de tickets par requête groupée
+MAX_BATCH_SIZE = 200
 
 
 class PosDirectPrintController(http.Controller):
@@ -14,37 +30,103 @@ class PosDirectPrintController(http.Controller):
         # Pourrait être étendu avec un token/signature
         return True
 
+    @http.route('/pos_direct_print/order/<int:order_id>/receipt', type='http', auth='user', csrf=False)
+    def get_receipt_by_id(self, order_id, **kwargs):
+        """
+        Ticket ESC/POS d'une commande désignée par son id (clé primaire) :
+        coût de recherche constant quelle que soit la taille de la table.
+        Ids séquentiels : réservé aux utilisateurs connectés ayant accès à
+        la commande (l'agent utilise les routes par uuid ou par nom).
+        """
+        order = request.env['pos.order'].browse(order_id).exists()
+        order.check_access('read')
+        return self._receipt_response(order.sudo(), str(order_id))
+
+    @http.route('/pos_direct_print/order/uuid/<string:order_uuid>/receipt', type='http', auth='public', csrf=False)
+    def get_receipt_by_uuid(self, order_uuid, **kwargs):
+        """
+        Ticket ESC/POS d'une commande désignée par l'uuid généré par le POS
+        (connu du front dès la validation, champ indexé).
+        """
+        order = request.env['pos.order'].sudo().search([('uuid', '=', order_uuid)], limit=1)
+        return self._receipt_response(order, order_uuid)
+
     @http.route('/pos_direct_print/receipt/<path:order_name>', type='http', auth='public', csrf=False)
     def get_receipt(self, order_name, **kwargs):
         """
         Retourne les données ESC/POS du ticket pour une commande.
         L'agent local appelle cette URL pour récupérer le ticket formaté.
+        (Recherche par nom : préférer les routes par id ou uuid)
         """
         # Chercher la commande
         order = request.env['pos.order'].sudo().search([('name', '=', order_name)], limit=1)
-        
+        return self._receipt_response(order, order_name)
+
+    def _receipt_response(self, order, order_key):
+        """Réponse HTTP du ticket d'une commande (404, 304, 200 ou 500)"""
         if not order:
             return Response(
-                json.dumps({'error': f'Commande {order_name} non trouvée'}),
+                json.dumps({'error': f'Commande {order_key} non trouvée'}),
                 status=404,
                 content_type='application/json'
             )
         
         try:
-            # Générer le ticket ESC/POS
-            receipt_data = order.generate_escpos_receipt()
+            # Compression négociée (le raster du logo se compresse très bien)
+            encoding = negotiate_encoding(request.httprequest.accept_encodings)
+
+            # L'appelant a déjà ce ticket (cache de l'agent, proxy) :
+            # 304 sans régénérer le ticket
+            etag = order._get_direct_print_etag()
+            if self._etag_matches(etag):
+                return Response(
+                    status=304,
+                    headers={
+                        'ETag': self._etag_header(etag, encoding),
+                        'Cache-Control': 'no-cache',
+                        'Vary': 'Accept-Encoding',
+                        **self._nv_logo_headers(order.config_id),
+                    }
+                )
+
+            # Ticket déjà généré (cache partagé) : réponse directe ;
+            # sinon envoi en flux, section par section, pendant le rendu
+            Receipt = request.env['pos.direct.print.receipt'].sudo()
+            body = Receipt._get_cached(order, etag)
+            if body is None:
+                # Données fidélité lues ici (lecture seule) ; le rendu en
+                # flux les reprend au lieu de les recalculer
+                loyalty_by_order = order._get_loyalty_data_batch()
+                body = self._stream_receipt(
+                    request.env.cr.dbname, order.id, etag, loyalty_by_order
+                )
+                if encoding:
+                    body = compress_stream(body, encoding)
+            elif len(body) < MIN_COMPRESS_SIZE:
+                encoding = None
+            elif encoding:
+                body = compress(body, encoding)
+
+            headers = {
+                'ETag': self._etag_header(etag, encoding),
+                'Cache-Control': 'no-cache',
+                'Vary': 'Accept-Encoding',
+                'Content-Disposition': f'attachment; filename="{order.name}.bin"',
+                'X-Order-Name': order.name,
+                'X-Order-Total': str(order.amount_total),
+                'X-Order-Date': order.date_order.isoformat() if order.date_order else '',
+                **self._nv_logo_headers(order.config_id),
+            }
+            if encoding:
+                headers['Content-Encoding'] = encoding
             
             # Retourner les bytes bruts
             return Response(
-                receipt_data,
+                body,
                 status=200,
                 content_type='application/octet-stream',
-                headers={
-                    'Content-Disposition': f'attachment; filename="{order_name}.bin"',
-                    'X-Order-Name': order_name,
-                    'X-Order-Total': str(order.amount_total),
-                    'X-Order-Date': order.date_order.isoformat() if order.date_order else '',
-                }
+                direct_passthrough=True,
+                headers=headers
             )
         except Exception as e:
             import traceback
@@ -57,6 +139,152 @@ class PosDirectPrintController(http.Controller):
                 content_type='application/json'
             )
 
+    @staticmethod
+    def _nv_logo_headers(configs):
+        """
+        Logo appelé par le ticket depuis la mémoire NV de l'imprimante :
+        empreinte et URL de la commande d'enregistrement, pour que l'agent
+        l'envoie d'abord si son imprimante ne l'a pas encore.
+        """
+        nv_logos = {config._get_direct_print_nv_logo() for config in configs} - {None}
+        if len(nv_logos) != 1:
+            return {}
+        logo_hash, logo_url = nv_logos.pop()
+        return {'X-Logo-Hash': logo_hash, 'X-Logo-Url': logo_url}
+
+    @staticmethod
+    def _etag_header(etag, encoding):
+        """ETag d'une représentation : distinct pour chaque codage"""
+        return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+    @staticmethod
+    def _etag_matches(etag):
+        """If-None-Match désigne ce ticket (quel que soit son codage)"""
+        if_none_match = request.httprequest.if_none_match
+        if etag in if_none_match:
+            return True
+        prefix = f'{etag}-'
+        return any(tag.startswith(prefix) for tag in if_none_match.as_set())
+
+    def _stream_receipt(self, dbname, order_id, etag, loyalty_by_order):
+        """
+        Génère le ticket pendant l'envoi de la réponse (transfert par
+        morceaux) : l'en-tête et le logo partent avant le calcul des totaux.
+        La requête est déjà terminée quand le corps est lu : le rendu utilise
+        son propre curseur, et le ticket complet est mis en cache à la fin.
+        """
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            order = env['pos.order'].browse(order_id)
+            sections = []
+            try:
+                for section in order.iter_escpos_receipt(loyalty_by_order):
+                    sections.append(section)
+                    yield section
+            except Exception:
+                # Réponse interrompue sans morceau final : l'agent voit un
+                # corps incomplet et n'imprime ni ne met en cache le ticket
+                _logger.exception("Génération du ticket %s interrompue", order_id)
+                raise
+            env['pos.direct.print.receipt']._store_receipts(
+                {order_id: b''.join(sections)}, {order_id: etag}
+            )
+
+    def _pack_receipt(self, order_name, receipt_data):
+        """
+        Trame d'un ticket dans un flux groupé (entiers big-endian) :
+        [longueur du nom: 2 octets][longueur du ticket: 4 octets][nom][ticket]
+        Un ticket vide signale une commande introuvable ou en erreur.
+        """
+        name = order_name.encode('utf-8')
+        return struct.pack('>HI', len(name), len(receipt_data)) + name + receipt_data
+
+    def _get_batch_keys(self):
+        """
+        Noms et uuids demandés : corps JSON ou paramètres répétés
+        (?name=..&uuid=..). Pas d'ids : route publique, des ids séquentiels
+        permettraient de parcourir tous les tickets.
+        """
+        httprequest = request.httprequest
+        if httprequest.mimetype == 'application/json':
+            payload = json.loads(httprequest.get_data() or b'{}')
+            names = payload.get('names') or []
+            uuids = payload.get('uuids') or []
+        else:
+            names = httprequest.values.getlist('name')
+            uuids = httprequest.values.getlist('uuid')
+        return [str(n) for n in names], [str(u) for u in uuids]
+
+    @http.route('/pos_direct_print/receipts', type='http', auth='public', methods=['GET', 'POST'], csrf=False)
+    def get_receipts(self, **kwargs):
+        """
+        Retourne plusieurs tickets en une seule requête (réimpressions de fin
+        de service, rattrapage après une coupure de l'agent).
+        Les commandes sont chargées en un seul recordset (prefetch partagé) ;
+        la réponse est une suite de trames (voir _pack_receipt), dans l'ordre
+        de la demande.
+        """
+        try:
+            names, uuids = self._get_batch_keys()
+        except (ValueError, TypeError) as e:
+            return Response(
+                json.dumps({'error': f'Requête invalide: {e}'}),
+                status=400,
+                content_type='application/json'
+            )
+
+        if len(names) + len(uuids) > MAX_BATCH_SIZE:
+            return Response(
+                json.dumps({'error': f'Maximum {MAX_BATCH_SIZE} tickets par requête'}),
+                status=400,
+                content_type='application/json'
+            )
+
+        orders = request.env['pos.order'].sudo().search(
+            ['|', ('name', 'in', names), ('uuid', 'in', uuids)]
+        )
+        by_name = {order.name: order for order in orders}
+        by_uuid = {order.uuid: order for order in orders}
+
+        requested = [(name, by_name.get(name)) for name in names]
+        requested += [(order_uuid, by_uuid.get(order_uuid)) for order_uuid in uuids]
+
+        # Rendu groupé (lectures communes à tout le lot) ; en cas d'erreur,
+        # ticket par ticket pour n'écarter que les commandes fautives
+        try:
+            receipts = orders._get_direct_print_receipts()
+        except Exception:
+            _logger.exception("Génération groupée des tickets impossible")
+            receipts = {}
+            for order in orders:
+                try:
+                    receipts[order.id] = order._get_direct_print_receipt()
+                except Exception:
+                    _logger.exception("Génération du ticket %s impossible", order.name)
+
+        chunks = []
+        for key, order in requested:
+            receipt_data = receipts.get(order.id, b'') if order else b''
+            chunks.append(self._pack_receipt(key, receipt_data))
+
+        body = b''.join(chunks)
+        headers = {
+            'X-Receipt-Count': str(len(requested)),
+            'Vary': 'Accept-Encoding',
+            **self._nv_logo_headers(orders.config_id),
+        }
+        encoding = negotiate_encoding(request.httprequest.accept_encodings)
+        if encoding and len(body) >= MIN_COMPRESS_SIZE:
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+
+        return Response(
+            body,
+            status=200,
+            content_type='application/octet-stream',
+            headers=headers
+        )
+
     @http.route('/pos_direct_print/status', type='http', auth='public', csrf=False)
     def status(self, **kwargs):
         """
@@ -66,7 +294,7 @@ class PosDirectPrintController(http.Controller):
             json.dumps({
                 'status': 'ok',
                 'module': 'pos_direct_print',
-                'version': '18.0.1.0.0'
+                'version': get_manifest('pos_direct_print').get('version')
             }),
             status=200,
             content_type='application/json'
@@ -96,6 +324,7 @@ class PosDirectPrintController(http.Controller):
                 'width': config.direct_print_width or 42,
                 'encoding': config.direct_print_encoding or 'cp437',
                 'print_logo': config.direct_print_logo,
+                'nv_logo': config.direct_print_nv_logo,
                 'print_barcode': config.direct_print_barcode,
                 'show_loyalty': config.direct_print_show_loyalty,
                 'footer_message': config.direct_print_footer or 'Merci de votre visite !',
@@ -106,6 +335,41 @@ class PosDirectPrintController(http.Controller):
             headers={"Access-Control-Allow-Origin": "*"}
         )
 
+    @http.route('/pos_direct_print/config/<int:config_id>/nv_logo', type='http', auth='public', csrf=False)
+    def get_nv_logo(self, config_id, **kwargs):
+        """
+        Commande d'enregistrement du logo en mémoire NV de l'imprimante
+        (GS ( L). L'agent l'envoie une seule fois par imprimante et par logo
+        (empreinte X-Logo-Hash des tickets).
+        """
+        config = request.env['pos.config'].sudo().browse(config_id).exists()
+        nv_logo = config._get_direct_print_nv_logo() if config else None
+        definition = (
+            config.company_id._get_direct_print_nv_logo_definition(
+                config._get_direct_print_paper_width()
+            )
+            if nv_logo
+            else b''
+        )
+        if not definition:
+            return Response(
+                json.dumps({'error': f'Pas de logo en mémoire NV pour la caisse {config_id}'}),
+                status=404,
+                content_type='application/json'
+            )
+
+        headers = {'X-Logo-Hash': nv_logo[0], 'Vary': 'Accept-Encoding'}
+        encoding = negotiate_encoding(request.httprequest.accept_encodings)
+        if encoding:
+            definition = compress(definition, encoding)
+            headers['Content-Encoding'] = encoding
+        return Response(
+            definition,
+            status=200,
+            content_type='application/octet-stream',
+            headers=headers
+        )
+
     @http.route('/pos_direct_print/test/<path:order_name>', type='http', auth='user', website=False)
     def test_receipt(self, order_name, **kwargs):
         """
@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 from . import pos_config
+from . import pos_direct_print_receipt
 from . import pos_order
+from . import res_company
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Commandes et helpers ESC/POS, sans dépendance à l'ORM
+(utilisables hors d'Odoo, ex: benchmarks).
+"""
+import functools
+import io
+import struct
+
+# ============================================================
+# COMMANDES ESC/POS
+# ============================================================
+ESC = "\x1b"
+GS = "\x1d"
+
+INIT_PRINTER = ESC + "@"
+BOLD_ON = ESC + "E\x01"
+BOLD_OFF = ESC + "E\x00"
+ALIGN_LEFT = ESC + "a\x00"
+ALIGN_CENTER = ESC + "a\x01"
+SIZE_NORMAL = ESC + "!\x00"
+SIZE_DOUBLE_HEIGHT = ESC + "!\x10"
+CUT_PAPER = GS + "V\x00"
+OPEN_CASH_DRAWER = ESC + "p\x00\x19\xfa"
+OPEN_CASH_DRAWER_ALTERNATIVE = ESC + "p\x01\x19\xfa"
+
+
+def feed(n):
+    return ESC + f"d{chr(n)}"
+
+
+def barcode_ean13(data):
+    """Génère un code-barres EAN-13"""
+    digits = "".join(filter(str.isdigit, str(data)))[:12].zfill(12)
+    return (
+        GS
+        + "h"
+        + chr(100)
+        + GS
+        + "w"
+        + chr(3)
+        + GS
+        + "H"
+        + chr(2)
+        + GS
+        + "f"
+        + chr(0)
+        + GS
+        + "k"
+        + "\x02"
+        + digits
+        + "\x00"
+    )
+
+
+def print_raster_image(image_data, width_bytes, height):
+    """Imprime une image raster"""
+    xL = width_bytes % 256
+    xH = width_bytes // 256
+    yL = height % 256
+    yH = height // 256
+    header = bytes([0x1D, 0x76, 0x30, 0x00, xL, xH, yL, yH])
+    return header + image_data
+
+
+# ============================================================
+# LOGO EN MÉMOIRE NV DE L'IMPRIMANTE (GS ( L)
+# ============================================================
+# Code clé du logo enregistré (2 caractères ASCII 32-126)
+NV_LOGO_KEY = b"DP"
+
+
+def define_nv_graphics(image_data, width_bytes, height, key=NV_LOGO_KEY):
+    """
+    Enregistre une image raster en mémoire NV de l'imprimante
+    (GS ( L fonction 67, ou GS 8 L au-delà de 64 Ko de paramètres).
+    L'image est conservée hors tension : à n'envoyer qu'une fois.
+    """
+    width = width_bytes * 8
+    params = (
+        bytes([0x30, 0x43, 0x30])  # m, fn 67, a = raster
+        + key
+        + bytes([0x01, width % 256, width // 256, height % 256, height // 256, 0x31])
+        + image_data
+    )
+    if len(params) <= 0xFFFF:
+        return b"\x1d(L" + struct.pack("<H", len(params)) + params
+    return b"\x1d8L" + struct.pack("<I", len(params)) + params
+
+
+def print_nv_graphics(key=NV_LOGO_KEY):
+    """Imprime une image enregistrée en mémoire NV (GS ( L fonction 69)"""
+    return b"\x1d(L\x06\x00\x30\x45" + key + b"\x01\x01"
+
+
+# Seuil noir/blanc : un pixel plus sombre que 128 est imprimé (bit à 1)
+_THRESHOLD_TABLE = [255 if x < 128 else 0 for x in range(256)]
+
+
+def convert_image_to_raster(image_binary, max_width=384):
+    """Convertit une image en données raster pour imprimante thermique"""
+    try:
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(image_binary))
+        img = img.convert("L")
+        if img.width > max_width:
+            ratio = max_width / img.width
+            new_height = int(img.height * ratio)
+            img = img.resize((max_width, new_height), Image.LANCZOS)
+        # Le mode "1" de PIL est déjà le format raster ESC/POS : 1 bit par
+        # pixel, bit de poids fort à gauche, lignes complétées à l'octet
+        img = img.point(_THRESHOLD_TABLE, "1")
+        width_bytes = (img.width + 7) // 8
+        return img.tobytes(), width_bytes, img.height
+    except Exception:
+        return None
+
+
+# ============================================================
+# CONSTRUCTION DU TICKET
+# ============================================================
+# Colonnes des lignes du ticket : ((proportion de la largeur, alignement), ...)
+# La dernière colonne prend toujours la largeur restante.
+COLUMNS_TOTAL = ((0.55, "left"), (0.25, "right"))
+COLUMNS_PRODUCT = ((0.65, "left"), (0.35, "right"))
+COLUMNS_PAYMENT = ((0.6, "left"), (0.4, "right"))
+COLUMNS_TAX = ((0.25, "center"), (0.25, "right"), (0.25, "right"), (0.25, "right"))
+
+
+@functools.lru_cache(maxsize=256)
+def encode_command(command, encoding="cp437"):
+    """
+    Commande ESC/POS en bytes, encodée comme le texte du ticket : les
+    paramètres au-delà de 0x7F suivent la page de code (ex: le \xfa
+    d'OPEN_CASH_DRAWER part en 0xA3 en cp437), comme avant le pré-encodage.
+    """
+    return command.encode(encoding, errors="replace")
+
+
+class ReceiptBuilder:
+    """
+    Tampon d'un ticket ESC/POS, directement en bytes.
+
+    Les commandes sont pré-encodées (une fois par page de code), les
+    largeurs de colonnes calculées une fois par largeur de ticket et les
+    formateurs de montants une fois par devise (caches partagés par toutes
+    les instances). Les segments ajoutés ne sont joints qu'une fois, à la
+    fin de chaque section.
+    """
+
+    __slots__ = (
+        "width", "encoding", "money", "_segments", "_separator",
+        "BOLD_ON", "BOLD_OFF", "ALIGN_LEFT", "ALIGN_CENTER", "OPEN_CASH_DRAWER",
+    )
+
+    NEWLINE = b"\n"
+
+    # (largeur, colonnes) -> ((largeur de colonne, alignement), ...)
+    _layouts = {}
+    # (symbole, position) -> fonction montant -> texte
+    _money_formatters = {}
+
+    def __init__(self, width=42, encoding="cp437", currency_symbol="Ar",
+                 currency_position="after"):
+        self.width = width
+        self.encoding = encoding
+        self.money = self.money_formatter(currency_symbol, currency_position)
+        self._segments = []
+        self._separator = None
+        self.BOLD_ON = encode_command(BOLD_ON, encoding)
+        self.BOLD_OFF = encode_command(BOLD_OFF, encoding)
+        self.ALIGN_LEFT = encode_command(ALIGN_LEFT, encoding)
+        self.ALIGN_CENTER = encode_command(ALIGN_CENTER, encoding)
+        self.OPEN_CASH_DRAWER = encode_command(OPEN_CASH_DRAWER, encoding)
+
+    @classmethod
+    def money_formatter(cls, symbol, position):
+        """Formateur de montants (espace pour les milliers, 2 décimales)"""
+        key = (symbol, position)
+        formatter = cls._money_formatters.get(key)
+        if formatter is None:
+            prefix = symbol if position == "before" else ""
+            suffix = "" if position == "before" else f" {symbol}"
+
+            def formatter(amount):
+                try:
+                    amount_str = f"{float(amount):,.2f}".replace(",", " ")
+                except (ValueError, TypeError):
+                    amount_str = "0.00"
+                return prefix + amount_str + suffix
+
+            cls._money_formatters[key] = formatter
+        return formatter
+
+    def layout(self, columns):
+        """Largeur et alignement de chaque colonne pour ce ticket"""
+        key = (self.width, columns)
+        layout = self._layouts.get(key)
+        if layout is None:
+            remaining = self.width
+            layout = []
+            for i, (ratio, align) in enumerate(columns):
+                col_width = remaining if i == len(columns) - 1 else int(self.width * ratio)
+                remaining -= col_width
+                layout.append((col_width, align))
+            layout = self._layouts[key] = tuple(layout)
+        return layout
+
+    def command(self, data):
+        """Ajoute une commande ESC/POS ou un segment déjà encodé"""
+        if data:
+            self._segments.append(
+                data if isinstance(data, bytes) else encode_command(data, self.encoding)
+            )
+
+    def line(self, text=""):
+        """Ajoute une ligne de texte (codage du ticket)"""
+        self._segments.append((str(text) + "\n").encode(self.encoding, errors="replace"))
+
+    def row(self, texts, columns):
+        """Ajoute une ligne en colonnes (texte tronqué par un point si trop long)"""
+        parts = []
+        for text, (col_width, align) in zip(texts, self.layout(columns)):
+            text = str(text)
+            if len(text) > col_width:
+                text = text[: col_width - 1] + "."
+            if align == "right":
+                parts.append(text.rjust(col_width))
+            elif align == "center":
+                parts.append(text.center(col_width))
+            else:
+                parts.append(text.ljust(col_width))
+        parts.append("\n")
+        self._segments.append("".join(parts).encode(self.encoding, errors="replace"))
+
+    def separator(self):
+        """Ajoute une ligne de tirets sur toute la largeur"""
+        if self._separator is None:
+            self._separator = ("-" * self.width + "\n").encode(self.encoding, errors="replace")
+        self._segments.append(self._separator)
+
+    def section(self):
+        """Retourne la section en cours et repart d'un tampon vide"""
+        data = b"".join(self._segments)
+        self._segments.clear()
+        return data
@@ -1,5 +1,38 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
+from odoo.tools import lru
+
+from .escpos import (
+    INIT_PRINTER,
+    BOLD_ON,
+    BOLD_OFF,
+    ALIGN_LEFT,
+    ALIGN_CENTER,
+    SIZE_NORMAL,
+    SIZE_DOUBLE_HEIGHT,
+    CUT_PAPER,
+    feed,
+    print_nv_graphics,
+)
+
+# Parties fixes des tickets (en-tête, pied, coupe) déjà encodées, par worker.
+# Clé : (base, caisse, dates de modification caisse/société/partenaire,
+#        empreinte du logo)
+_TEMPLATE_CACHE = lru.LRU(64)
+
+# Champs dont dépendent les parties fixes du ticket
+TEMPLATE_CONFIG_FIELDS = {
+    "company_id",
+    "direct_print_width",
+    "direct_print_paper_width",
+    "direct_print_encoding",
+    "direct_print_logo",
+    "direct_print_nv_logo",
+    "direct_print_barcode",
+    "direct_print_footer",
+    "direct_print_goodbye",
+}
+TEMPLATE_COMPANY_FIELDS = {"name", "phone", "email", "website", "logo"}
 
 
 class PosConfig(models.Model):
@@ -40,6 +73,13 @@ class PosConfig(models.Model):
         default=42,
         help="Largeur du ticket en caractères (42 pour 80mm, 32 pour 58mm)"
     )
+
+    direct_print_paper_width = fields.Integer(
+        string="Largeur (points)",
+        default=384,
+        help="Largeur imprimable en points, largeur max du logo "
+             "(384 pour 58mm, 576 pour 80mm)"
+    )
     
     direct_print_encoding = fields.Selection([
         ('cp437', 'CP437 (Standard)'),
@@ -58,6 +98,15 @@ class PosConfig(models.Model):
         default=True,
         help="Imprimer le logo de la société sur le ticket"
     )
+
+    direct_print_nv_logo = fields.Boolean(
+        string="Logo en mémoire imprimante",
+        default=False,
+        help="Le logo est enregistré une seule fois dans la mémoire NV de "
+             "l'imprimante (GS ( L) : les tickets ne contiennent plus qu'une "
+             "courte commande d'impression. À désactiver pour les imprimantes "
+             "sans mémoire NV (logo envoyé avec chaque ticket)."
+    )
     
     direct_print_barcode = fields.Boolean(
         string="Imprimer le code-barres",
@@ -87,6 +136,129 @@ class PosConfig(models.Model):
     )
 
 
+    def write(self, vals):
+        if TEMPLATE_CONFIG_FIELDS.intersection(vals):
+            _TEMPLATE_CACHE.clear()
+        return super().write(vals)
+
+    def _get_direct_print_templates(self):
+        """
+        Retourne les segments fixes du ticket, pré-encodés pour cette caisse :
+        header, no_loyalty, footer, barcode_prefix et cut (bytes).
+        """
+        self.ensure_one()
+        company = self.company_id
+        key = (
+            self.env.cr.dbname,
+            self.id,
+            self.write_date,
+            company.write_date,
+            company.partner_id.write_date,
+            company._get_direct_print_logo_checksum() if self.direct_print_logo else None,
+        )
+        templates = _TEMPLATE_CACHE.get(key)
+        if templates is None:
+            templates = self._build_direct_print_templates()
+            _TEMPLATE_CACHE[key] = templates
+        return templates
+
+    def _get_direct_print_nv_logo(self):
+        """
+        Logo enregistré en mémoire NV pour cette caisse : (empreinte, chemin
+        de la commande d'enregistrement), ou None si le logo est imprimé en
+        ligne (ou absent).
+        """
+        self.ensure_one()
+        if not (self.direct_print_logo and self.direct_print_nv_logo):
+            return None
+        checksum = self.company_id._get_direct_print_logo_checksum()
+        if not checksum:
+            return None
+        # Le logo enregistré dépend aussi de la largeur du papier
+        logo_hash = f"{checksum}-{self._get_direct_print_paper_width()}"
+        return logo_hash, f"/pos_direct_print/config/{self.id}/nv_logo"
+
+    def _get_direct_print_paper_width(self):
+        """Largeur imprimable en points (taille max du logo)"""
+        self.ensure_one()
+        return self.direct_print_paper_width or 384
+
+    def _build_direct_print_templates(self):
+        """Encode les parties du ticket identiques pour toutes les commandes"""
+        width = self.direct_print_width or 42
+        encoding = self.direct_print_encoding or "cp437"
+        footer_message = self.direct_print_footer or "Merci de votre visite !"
+        goodbye_message = self.direct_print_goodbye or "A bientôt !"
+        company = self.company_id
+
+        def encode(text):
+            if isinstance(text, bytes):
+                return text
+            return str(text).encode(encoding, errors="replace")
+
+        def line(text):
+            return encode(text) + b"\n"
+
+        # === EN-TÊTE ===
+        header = [encode(INIT_PRINTER)]
+        if self.direct_print_logo:
+            try:
+                # Logo en mémoire NV : l'agent l'enregistre au besoin (voir
+                # _get_direct_print_nv_logo), le ticket ne fait que l'appeler
+                if self._get_direct_print_nv_logo():
+                    logo = print_nv_graphics()
+                else:
+                    logo = company._get_direct_print_logo_raster(
+                        self._get_direct_print_paper_width()
+                    )
+                if logo:
+                    header += [encode(ALIGN_CENTER), logo, encode(feed(2))]
+            except Exception:
+                pass
+
+        header.append(encode(ALIGN_CENTER + BOLD_ON + SIZE_DOUBLE_HEIGHT))
+        header.append(line(f"--- {company.name} ---"))
+        header.append(encode(SIZE_NORMAL + BOLD_OFF))
+        if company.phone:
+            header.append(line(f"Tel: {company.phone}"))
+        if company.email:
+            header.append(line(company.email))
+        if company.website:
+            header.append(line(company.website))
+        header.append(line("-" * width))
+        header.append(encode(ALIGN_LEFT))
+
+        # === BANDEAU SANS FIDÉLITÉ ===
+        no_loyalty = [
+            line(""),
+            encode(ALIGN_CENTER + BOLD_ON),
+            line("*** PAS DE CARTE FIDÉLITÉ ? ***"),
+            encode(BOLD_OFF),
+            line("Demandez votre carte, elle est gratuite!"),
+            encode(ALIGN_LEFT),
+        ]
+
+        # === PIED DE PAGE ===
+        footer = [
+            line(""),
+            encode(ALIGN_CENTER),
+            line(footer_message),
+            line(goodbye_message),
+        ]
+
+        return {
+            "header": b"".join(header),
+            "no_loyalty": b"".join(no_loyalty),
+            "footer": b"".join(footer),
+            "barcode_prefix": (
+                encode(feed(1) + ALIGN_CENTER + feed(1))
+                if self.direct_print_barcode
+                else b""
+            ),
+            "cut": encode(feed(4) + CUT_PAPER),
+        }
+
+
 class PosSession(models.Model):
     _inherit = 'pos.session'
 
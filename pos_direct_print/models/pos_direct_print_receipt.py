@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from odoo.tools import mute_logger
+import base64
+
+import psycopg2
+
+
+class PosDirectPrintReceipt(models.Model):
+    """
+    Tickets ESC/POS déjà générés, partagés par tous les workers Odoo.
+
+    Une ligne par commande : le ticket n'est valable que tant que son
+    empreinte (voir pos.order._get_direct_print_etag) est inchangée. Les
+    modifications des lignes et des paiements suppriment la ligne.
+    """
+
+    _name = "pos.direct.print.receipt"
+    _description = "Ticket d'impression directe (cache)"
+    _log_access = False
+
+    order_id = fields.Many2one(
+        "pos.order", required=True, index=True, ondelete="cascade"
+    )
+    fingerprint = fields.Char(required=True)
+    data = fields.Binary(attachment=False, required=True)
+
+    _sql_constraints = [
+        ("order_uniq", "unique(order_id)", "Un seul ticket en cache par commande."),
+    ]
+
+    @api.model
+    def _get_receipts(self, orders):
+        """
+        Retourne {id de commande: ticket} : lu en cache si son empreinte est
+        à jour, sinon généré (en une passe pour tout le lot) puis enregistré.
+        """
+        fingerprints = orders._get_direct_print_etags()
+        receipts, entry_by_order = self._read_receipts(orders, fingerprints)
+
+        missing = orders.filtered(lambda o: o.id not in receipts)
+        if not missing:
+            return receipts
+
+        rendered = missing.generate_escpos_receipts()
+        receipts.update(rendered)
+        self._store_receipts(rendered, fingerprints, entry_by_order)
+        return receipts
+
+    @api.model
+    def _get_cached(self, order, fingerprint):
+        """Ticket en cache de la commande s'il est à jour, sinon None"""
+        receipts, _entries = self._read_receipts(order, {order.id: fingerprint})
+        return receipts.get(order.id)
+
+    @api.model
+    def _read_receipts(self, orders, fingerprints):
+        """
+        Lit en une requête les tickets en cache des commandes.
+        Retourne ({id de commande: ticket à jour}, {id de commande: ligne}) :
+        les lignes périmées sont renvoyées pour être réécrites sur place.
+        """
+        entries = self.search([("order_id", "in", orders.ids)])
+        entries.fetch(["order_id", "fingerprint", "data"])
+        entry_by_order = {entry.order_id.id: entry for entry in entries}
+
+        receipts = {}
+        for order_id, entry in entry_by_order.items():
+            if entry.fingerprint == fingerprints[order_id]:
+                receipts[order_id] = base64.b64decode(entry.data)
+        return receipts, entry_by_order
+
+    @api.model
+    def _store_receipts(self, receipts, fingerprints, entry_by_order=None):
+        """
+        Enregistre des tickets générés ({id de commande: bytes}).
+        `entry_by_order` : lignes existantes déjà lues, recherchées sinon.
+        """
+        if entry_by_order is None:
+            entries = self.search([("order_id", "in", list(receipts))])
+            entry_by_order = {entry.order_id.id: entry for entry in entries}
+        try:
+            # Un autre worker a pu enregistrer les mêmes tickets entre-temps
+            with self.env.cr.savepoint(), mute_logger("odoo.sql_db"):
+                new_values = []
+                for order_id, receipt_data in receipts.items():
+                    values = {
+                        "fingerprint": fingerprints[order_id],
+                        "data": base64.b64encode(receipt_data),
+                    }
+                    entry = entry_by_order.get(order_id)
+                    if entry:
+                        entry.write(values)
+                    else:
+                        new_values.append(dict(values, order_id=order_id))
+                self.create(new_values)
+        except psycopg2.Error:
+            pass
+
+    @api.model
+    def _invalidate(self, orders):
+        """Supprime les tickets en cache des commandes données"""
+        if orders:
+            self.search([("order_id", "in", orders.ids)]).unlink()
@@ -1,108 +1,58 @@
 # -*- coding: utf-8 -*-
-from odoo import models, api
+from odoo import models, fields, api
+from odoo.modules.module import get_manifest
+from odoo.tools import SQL
 import base64
-import io
-
-# ============================================================
-# COMMANDES ESC/POS
-# ============================================================
-ESC = "\x1b"
-GS = "\x1d"
-
-INIT_PRINTER = ESC + "@"
-BOLD_ON = ESC + "E\x01"
-BOLD_OFF = ESC + "E\x00"
-ALIGN_LEFT = ESC + "a\x00"
-ALIGN_CENTER = ESC + "a\x01"
-SIZE_NORMAL = ESC + "!\x00"
-SIZE_DOUBLE_HEIGHT = ESC + "!\x10"
-CUT_PAPER = GS + "V\x00"
-OPEN_CASH_DRAWER = ESC + "p\x00\x19\xfa"
-OPEN_CASH_DRAWER_ALTERNATIVE = ESC + "p\x01\x19\xfa"
-
-
-def feed(n):
-    return ESC + f"d{chr(n)}"
-
-
-def barcode_ean13(data):
-    """Génère un code-barres EAN-13"""
-    digits = "".join(filter(str.isdigit, str(data)))[:12].zfill(12)
-    return (
-        GS
-        + "h"
-        + chr(100)
-        + GS
-        + "w"
-        + chr(3)
-        + GS
-        + "H"
-        + chr(2)
-        + GS
-        + "f"
-        + chr(0)
-        + GS
-        + "k"
-        + "\x02"
-        + digits
-        + "\x00"
-    )
-
-
-def print_raster_image(image_data, width_bytes, height):
-    """Imprime une image raster"""
-    xL = width_bytes % 256
-    xH = width_bytes // 256
-    yL = height % 256
-    yH = height // 256
-    header = bytes([0x1D, 0x76, 0x30, 0x00, xL, xH, yL, yH])
-    return header + image_data
-
-
-def convert_image_to_raster(image_binary, max_width=384):
-    """Convertit une image en données raster pour imprimante thermique"""
-    try:
-        from PIL import Image
-
-        img = Image.open(io.BytesIO(image_binary))
-        img = img.convert("L")
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.LANCZOS)
-        img = img.point(lambda x: 0 if x < 128 else 255, "1")
-        width = img.width
-        height = img.height
-        width_bytes = (width + 7) // 8
-        pixels = list(img.getdata())
-        data = bytearray()
-        for y in range(height):
-            for x_byte in range(width_bytes):
-                byte = 0
-                for bit in range(8):
-                    x = x_byte * 8 + bit
-                    if x < width:
-                        pixel_index = y * width + x
-                        if pixel_index < len(pixels) and pixels[pixel_index] == 0:
-                            byte |= 1 << (7 - bit)
-                data.append(byte)
-        return bytes(data), width_bytes, height
-    except Exception:
-        return None
+import hashlib
+import json
+
+from .escpos import (
+    COLUMNS_PAYMENT,
+    COLUMNS_PRODUCT,
+    COLUMNS_TAX,
+    COLUMNS_TOTAL,
+    ReceiptBuilder,
+    barcode_ean13,
+)
+
+
+# États d'une commande payée : l'instantané fidélité peut être enregistré
+PAID_STATES = ("paid", "done", "invoiced")
 
 
 class PosOrder(models.Model):
     _inherit = "pos.order"
 
-    def _get_loyalty_data(self):
-        """Récupère les données complètes du programme fidélité"""
+    # Fidélité telle qu'au paiement : {"data": données ou None, "final": bool}
+    # Enregistrée au paiement uniquement, jamais pendant un rendu.
+    # "final" : calculée depuis l'historique de la commande (ou fidélité non
+    # installée) ; sinon provisoire, et recalculée (sans écriture) au rendu
+    direct_print_loyalty = fields.Json(copy=False, readonly=True)
+
+    # Clé de recherche des tickets (routes /order/uuid/..., print.js, agent)
+    uuid = fields.Char(index=True)
+
+    def action_pos_order_paid(self):
+        res = super().action_pos_order_paid()
+        orders = self.filtered("partner_id")
+        if orders:
+            orders._store_loyalty_snapshots(orders._compute_loyalty_snapshots())
+        return res
+
+    def _get_loyalty_data(self, history=None, cards=None):
+        """
+        Récupère les données complètes du programme fidélité.
+        `history` et `cards` : historique de la commande et cartes du client
+        déjà chargés (voir _get_loyalty_data_batch), recherchés sinon.
+        """
         if not self.partner_id:
             return None
 
         try:
             # Chercher l'historique de fidélité pour cette commande
-            LoyaltyHistory = self.env["loyalty.history"].sudo()
-            history = LoyaltyHistory.search([("order_id", "=", self.id)])
+            if history is None:
+                LoyaltyHistory = self.env["loyalty.history"].sudo()
+                history = LoyaltyHistory.search([("order_id", "=", self.id)])
 
             # Calculer les points utilisés depuis les lignes
             total_points_used = sum(
@@ -142,8 +92,9 @@ class PosOrder(models.Model):
                             }
 
             # Fallback: chercher carte fidélité du client
-            LoyaltyCard = self.env["loyalty.card"].sudo()
-            cards = LoyaltyCard.search([("partner_id", "=", self.partner_id.id)])
+            if cards is None:
+                LoyaltyCard = self.env["loyalty.card"].sudo()
+                cards = LoyaltyCard.search([("partner_id", "=", self.partner_id.id)])
 
             for card in cards:
                 program_name = card.program_id.name if card.program_id else ""
@@ -180,6 +131,119 @@ class PosOrder(models.Model):
 
         return None
 
+    def _compute_loyalty_snapshots(self):
+        """
+        Données fidélité de plusieurs commandes : une recherche d'historique
+        et une recherche de cartes pour tout le lot.
+        Retourne {id de commande: {"data": données ou None, "final": bool}}.
+        """
+        if "loyalty.card" not in self.env or "loyalty.history" not in self.env:
+            # Fidélité non installée : rien à recalculer plus tard
+            return {order.id: {"data": None, "final": True} for order in self}
+        try:
+            histories = self.env["loyalty.history"].sudo().search(
+                [("order_id", "in", self.ids)]
+            )
+            cards = self.env["loyalty.card"].sudo().search(
+                [("partner_id", "in", self.partner_id.ids)]
+            )
+            # Programmes des cartes : une lecture pour tout le lot
+            (histories.card_id | cards).program_id.mapped("name")
+        except Exception:
+            return {order.id: {"data": None, "final": False} for order in self}
+
+        history_by_order = histories.grouped("order_id")
+        cards_by_partner = cards.grouped("partner_id")
+        snapshots = {}
+        for order in self:
+            history = history_by_order.get(order, histories.browse())
+            snapshots[order.id] = {
+                "data": order._get_loyalty_data(
+                    history=history,
+                    cards=cards_by_partner.get(order.partner_id, cards.browse()),
+                ),
+                "final": bool(history),
+            }
+        return snapshots
+
+    def _store_loyalty_snapshots(self, snapshots):
+        """
+        Enregistre l'instantané fidélité des commandes payées, en une seule
+        requête pour tout le lot. Un instantané inchangé n'est pas réécrit.
+        Appelé au paiement uniquement (jamais depuis un rendu) ; write_date
+        est mise à jour comme par une écriture de l'ORM.
+        """
+        orders = self.filtered(
+            lambda o: o.state in PAID_STATES
+            and o.direct_print_loyalty != snapshots[o.id]
+        )
+        if not orders:
+            return
+        fnames = ["direct_print_loyalty", "write_date", "write_uid"]
+        orders.flush_recordset(fnames)
+        self.env.cr.execute(SQL(
+            """
+            UPDATE pos_order
+               SET direct_print_loyalty = snapshot.data::jsonb,
+                   write_date = (now() at time zone 'UTC'),
+                   write_uid = %s
+              FROM (VALUES %s) AS snapshot(id, data)
+             WHERE pos_order.id = snapshot.id
+            """,
+            self.env.uid,
+            SQL(", ").join(
+                SQL("(%s, %s)", order.id, json.dumps(snapshots[order.id]))
+                for order in orders
+            ),
+        ))
+        orders.invalidate_recordset(fnames)
+
+    def _get_loyalty_data_batch(self):
+        """
+        Données fidélité à imprimer : instantané figé s'il existe, calculé
+        sinon. Lecture seule : rien n'est enregistré ici (voir
+        action_pos_order_paid).
+        Retourne {id de commande: données fidélité ou None}.
+        """
+        orders = self.filtered(
+            lambda o: o.partner_id and o.config_id.direct_print_show_loyalty
+        )
+        result = {}
+        pending = orders.browse()
+        for order in orders:
+            snapshot = order.direct_print_loyalty
+            if snapshot and snapshot.get("final"):
+                result[order.id] = snapshot.get("data")
+            else:
+                pending |= order
+
+        if pending:
+            snapshots = pending._compute_loyalty_snapshots()
+            for order in pending:
+                result[order.id] = snapshots[order.id]["data"]
+        return result
+
+    def _prefetch_direct_print_data(self):
+        """
+        Charge en quelques lectures groupées ce que lit le rendu des tickets
+        (lignes, produits, taxes, paiements), pour toutes les commandes :
+        le nombre de requêtes ne dépend plus du nombre de lignes ni de
+        commandes.
+        """
+        self.mapped("date_order")
+        self.user_id.mapped("name")
+        self.partner_id.mapped("name")
+        self.currency_id.mapped("symbol")
+        lines = self.lines
+        lines.mapped("price_subtotal_incl")
+        lines.product_id.mapped("lst_price")
+        lines.tax_ids.mapped("amount")
+        if "reward_id" in lines._fields:
+            lines.reward_id.mapped("discount")
+        self.payment_ids.payment_method_id.mapped("name")
+        if "table_id" in self._fields:
+            self.table_id.floor_id.mapped("name")
+
     def _get_loyalty_discount_pct(self):
         """Récupère le pourcentage de remise fidélité depuis les lignes reward"""
         for ln in self.lines:
@@ -264,113 +328,74 @@ class PosOrder(models.Model):
         Utilise la configuration depuis pos.config.
         """
         self.ensure_one()
+        return self.generate_escpos_receipts()[self.id]
+
+    def generate_escpos_receipts(self):
+        """
+        Génère les tickets de toutes les commandes du recordset.
+        Les données sont chargées une fois pour tout le lot.
+        Retourne {id de commande: bytes ESC/POS}.
+        """
+        self._prefetch_direct_print_data()
+        loyalty_by_order = self._get_loyalty_data_batch()
+        # Parties fixes du ticket, pré-encodées par caisse (voir pos.config)
+        templates_by_config = {
+            config.id: config._get_direct_print_templates()
+            for config in self.config_id
+        }
+        return {
+            order.id: b"".join(
+                order._iter_escpos_receipt(
+                    templates_by_config[order.config_id.id],
+                    loyalty_by_order.get(order.id),
+                )
+            )
+            for order in self
+        }
+
+    def iter_escpos_receipt(self, loyalty_by_order=None):
+        """
+        Génère le ticket section par section (en-tête, produits, totaux,
+        paiements, pied) : chaque section peut être envoyée avant que la
+        suivante soit calculée.
+        loyalty_by_order : données fidélité déjà chargées par l'appelant
+        (voir _get_loyalty_data_batch), calculées sinon.
+        """
+        self.ensure_one()
+        self._prefetch_direct_print_data()
+        if loyalty_by_order is None:
+            loyalty_by_order = self._get_loyalty_data_batch()
+        loyalty = loyalty_by_order.get(self.id)
+        templates = self.config_id._get_direct_print_templates()
+        yield from self._iter_escpos_receipt(templates, loyalty)
+
+    def _iter_escpos_receipt(self, templates, loyalty):
+        """Assemble le ticket d'une commande (données déjà chargées)"""
+        self.ensure_one()
 
         # Récupérer la configuration depuis pos.config
         config = self.config_id
-        width = config.direct_print_width or 42
-        encoding = config.direct_print_encoding or "cp437"
-        print_logo = (
-            config.direct_print_logo if config.direct_print_logo is not None else True
-        )
         print_barcode = (
             config.direct_print_barcode
             if config.direct_print_barcode is not None
             else True
         )
-        show_loyalty = (
-            config.direct_print_show_loyalty
-            if config.direct_print_show_loyalty is not None
-            else True
+        currency = self.currency_id
+        receipt = ReceiptBuilder(
+            width=config.direct_print_width or 42,
+            encoding=config.direct_print_encoding or "cp437",
+            currency_symbol=currency.symbol or "Ar",
+            currency_position="before" if currency.position == "before" else "after",
         )
-        footer_message = config.direct_print_footer or "Merci de votre visite !"
-        goodbye_message = config.direct_print_goodbye or "A bientôt !"
-
-        output = bytearray()
-
-        def to_bytes(text):
-            if isinstance(text, bytes):
-                return text
-            return str(text).encode(encoding, errors="replace")
+        add = receipt.line
+        cmd = receipt.command
+        row = receipt.row
+        format_money = receipt.money
+        bold_on = receipt.BOLD_ON
+        bold_off = receipt.BOLD_OFF
 
-        def add(text):
-            output.extend(to_bytes(text))
-            output.extend(b"\n")
-
-        def cmd(c):
-            if isinstance(c, bytes):
-                output.extend(c)
-            else:
-                output.extend(to_bytes(c))
-
-        def table_row(columns):
-            result = ""
-            remaining = width
-            for i, col in enumerate(columns):
-                text = str(col.get("text", ""))
-                width_ratio = col.get("width", 0.5)
-                align = col.get("align", "left")
-                col_width = int(width * width_ratio)
-                if i == len(columns) - 1:
-                    col_width = remaining
-                remaining -= col_width
-                if len(text) > col_width:
-                    text = text[: col_width - 1] + "."
-                if align == "right":
-                    text = text.rjust(col_width)
-                elif align == "center":
-                    text = text.center(col_width)
-                else:
-                    text = text.ljust(col_width)
-                result += text
-            return result
-
-        def separator(char="-"):
-            return char * width
-
-        def format_money(amount, symbol=None, position=None):
-            currency = self.currency_id
-            sym = symbol or currency.symbol or "Ar"
-            pos = position or ("before" if currency.position == "before" else "after")
-            try:
-                amount_str = f"{float(amount):,.2f}".replace(",", " ")
-            except (ValueError, TypeError):
-                amount_str = "0.00"
-            if pos == "before":
-                return f"{sym}{amount_str}"
-            return f"{amount_str} {sym}"
-
-        company = self.company_id
-
-        # === INITIALISATION ===
-        cmd(INIT_PRINTER)
-
-        # === LOGO ===
-        if print_logo and company.logo:
-            try:
-                logo_binary = base64.b64decode(company.logo)
-                result = convert_image_to_raster(logo_binary, 384)
-                if result:
-                    data, width_bytes, height = result
-                    cmd(ALIGN_CENTER)
-                    cmd(print_raster_image(data, width_bytes, height))
-                    cmd(feed(2))
-            except Exception:
-                pass
-
-        # === EN-TÊTE ===
-        cmd(ALIGN_CENTER + BOLD_ON + SIZE_DOUBLE_HEIGHT)
-        add(f"--- {company.name} ---")
-        cmd(SIZE_NORMAL + BOLD_OFF)
-
-        if company.phone:
-            add(f"Tel: {company.phone}")
-        if company.email:
-            add(company.email)
-        if company.website:
-            add(company.website)
-
-        add(separator())
-        cmd(ALIGN_LEFT)
+        # === EN-TÊTE (initialisation, logo, société) ===
+        yield templates["header"]
 
         # === INFOS TICKET ===
         add(f"Date : {self.date_order.strftime('%d/%m/%Y %H:%M')}")
@@ -388,19 +413,14 @@ class PosOrder(models.Model):
             if hasattr(self, "customer_count") and self.customer_count:
                 add(f"Couvert(s): {self.customer_count}")
 
-        add(separator())
+        receipt.separator()
+
+        yield receipt.section()
 
         # === PRODUITS ===
-        cmd(BOLD_ON)
-        add(
-            table_row(
-                [
-                    {"text": "ARTICLES", "width": 0.55, "align": "left"},
-                    {"text": "Totals TTC", "width": 0.25, "align": "right"},
-                ]
-            )
-        )
-        cmd(BOLD_OFF)
+        cmd(bold_on)
+        row(("ARTICLES", "Totals TTC"), COLUMNS_TOTAL)
+        cmd(bold_off)
 
         # Calculer taux de taxe principal
         tax_rate = 0
@@ -457,30 +477,12 @@ class PosOrder(models.Model):
             )
 
             # Afficher la ligne
-            cmd(BOLD_ON)
-            if is_free:
-                add(
-                    table_row(
-                        [
-                            {"text": f"({qty}) {name}", "width": 0.65, "align": "left"},
-                            {"text": "*OFFERT", "width": 0.35, "align": "right"},
-                        ]
-                    )
-                )
-            else:
-                add(
-                    table_row(
-                        [
-                            {"text": f"({qty}) {name}", "width": 0.65, "align": "left"},
-                            {
-                                "text": format_money(subtotal),
-                                "width": 0.35,
-                                "align": "right",
-                            },
-                        ]
-                    )
-                )
-            cmd(BOLD_OFF)
+            cmd(bold_on)
+            row(
+                (f"({qty}) {name}", "*OFFERT" if is_free else format_money(subtotal)),
+                COLUMNS_PRODUCT,
+            )
+            cmd(bold_off)
 
             # Afficher remise si présente
             effective_discount = discount if discount > 0 else pricelist_discount
@@ -494,69 +496,34 @@ class PosOrder(models.Model):
 
             add("")
 
+        yield receipt.section()
+
         # === REMISE GLOBALE (fidélité) ===
         loyalty_discount_pct = self._get_loyalty_discount_pct()
         if loyalty_discount_pct and loyalty_discount_pct > 0:
-            add(separator())
-            cmd(ALIGN_CENTER + BOLD_ON)
+            receipt.separator()
+            cmd(receipt.ALIGN_CENTER + bold_on)
             add(f"Remise de {loyalty_discount_pct:.0f}% sur votre commande")
-            cmd(BOLD_OFF + ALIGN_LEFT)
+            cmd(bold_off + receipt.ALIGN_LEFT)
 
-        add(separator())
+        receipt.separator()
 
         # === TOTAUX ===
 
         # Total sans remise
         if total_sans_remise > self.amount_total + 0.01:
-            add(
-                table_row(
-                    [
-                        {"text": "TOTAL SANS REMISE", "width": 0.55, "align": "left"},
-                        {
-                            "text": format_money(total_sans_remise),
-                            "width": 0.25,
-                            "align": "right",
-                        },
-                    ]
-                )
-            )
+            row(("TOTAL SANS REMISE", format_money(total_sans_remise)), COLUMNS_TOTAL)
 
         # Remises sur produits
         if individual_discounts > 0:
-            add(
-                table_row(
-                    [
-                        {
-                            "text": "REMISES SUR PRODUITS",
-                            "width": 0.55,
-                            "align": "left",
-                        },
-                        {
-                            "text": format_money(individual_discounts),
-                            "width": 0.25,
-                            "align": "right",
-                        },
-                    ]
-                )
-            )
+            row(("REMISES SUR PRODUITS", format_money(individual_discounts)), COLUMNS_TOTAL)
 
         # Remise globale (fidélité)
         if loyalty_discount_pct and loyalty_discount_pct > 0:
             subtotal_before_global = total_sans_remise - individual_discounts
             global_discount = subtotal_before_global * (loyalty_discount_pct / 100)
             if global_discount > 0:
-                add(
-                    table_row(
-                        [
-                            {"text": "REMISE GLOBALE", "width": 0.55, "align": "left"},
-                            {
-                                "text": format_money(global_discount),
-                                "width": 0.25,
-                                "align": "right",
-                            },
-                        ]
-                    )
-                )
+                row(("REMISE GLOBALE", format_money(global_discount)), COLUMNS_TOTAL)
 
         # Total des remises
         total_discount = individual_discounts
@@ -565,131 +532,63 @@ class PosOrder(models.Model):
             total_discount += subtotal_before_global * (loyalty_discount_pct / 100)
 
         if total_discount > 0:
-            add(
-                table_row(
-                    [
-                        {"text": "TOTAL DES REMISES", "width": 0.55, "align": "left"},
-                        {
-                            "text": format_money(total_discount),
-                            "width": 0.25,
-                            "align": "right",
-                        },
-                    ]
-                )
-            )
+            row(("TOTAL DES REMISES", format_money(total_discount)), COLUMNS_TOTAL)
 
         # Total à payer
         total_qty = sum(l.qty for l in self.lines if l.price_unit >= 0)
-        cmd(BOLD_ON)
-        add(
-            table_row(
-                [
-                    {
-                        "text": f"TOTAL A PAYER ({int(total_qty)})",
-                        "width": 0.55,
-                        "align": "left",
-                    },
-                    {
-                        "text": format_money(self.amount_total),
-                        "width": 0.25,
-                        "align": "right",
-                    },
-                ]
-            )
+        cmd(bold_on)
+        row(
+            (f"TOTAL A PAYER ({int(total_qty)})", format_money(self.amount_total)),
+            COLUMNS_TOTAL,
         )
-        cmd(BOLD_OFF)
+        cmd(bold_off)
 
         # === DÉTAILS TAXES ===
         tax_details = self._get_tax_details()
         if tax_details and self.amount_tax > 0:
             add("")
-            add(
-                table_row(
-                    [
-                        {"text": "TAUX", "width": 0.25, "align": "center"},
-                        {"text": "HT", "width": 0.25, "align": "right"},
-                        {"text": "TVA", "width": 0.25, "align": "right"},
-                        {"text": "TTC", "width": 0.25, "align": "right"},
-                    ]
-                )
-            )
-            add(separator())
+            row(("TAUX", "HT", "TVA", "TTC"), COLUMNS_TAX)
+            receipt.separator()
 
             for tax in tax_details:
-                add(
-                    table_row(
-                        [
-                            {
-                                "text": f"{tax['rate']:.0f}%",
-                                "width": 0.25,
-                                "align": "center",
-                            },
-                            {
-                                "text": format_money(tax["base"]),
-                                "width": 0.25,
-                                "align": "right",
-                            },
-                            {
-                                "text": format_money(tax["amount"]),
-                                "width": 0.25,
-                                "align": "right",
-                            },
-                            {
-                                "text": format_money(tax["total"]),
-                                "width": 0.25,
-                                "align": "right",
-                            },
-                        ]
-                    )
+                row(
+                    (
+                        f"{tax['rate']:.0f}%",
+                        format_money(tax["base"]),
+                        format_money(tax["amount"]),
+                        format_money(tax["total"]),
+                    ),
+                    COLUMNS_TAX,
                 )
 
+        yield receipt.section()
+
         # === PAIEMENTS ===
         if self.payment_ids:
             add("")
             add("Encaissement:")
             for payment in self.payment_ids:
                 if payment.amount > 0:
-                    add(
-                        table_row(
-                            [
-                                {
-                                    "text": payment.payment_method_id.name,
-                                    "width": 0.6,
-                                    "align": "left",
-                                },
-                                {
-                                    "text": format_money(payment.amount),
-                                    "width": 0.4,
-                                    "align": "right",
-                                },
-                            ]
-                        )
+                    row(
+                        (payment.payment_method_id.name, format_money(payment.amount)),
+                        COLUMNS_PAYMENT,
                     )
 
         # Rendu monnaie
         total_paid = sum(p.amount for p in self.payment_ids if p.amount > 0)
         change = total_paid - self.amount_total
         if change > 0.01:
-            add(
-                table_row(
-                    [
-                        {"text": "Rendu", "width": 0.6, "align": "left"},
-                        {"text": format_money(change), "width": 0.4, "align": "right"},
-                    ]
-                )
-            )
+            row(("Rendu", format_money(change)), COLUMNS_PAYMENT)
 
         # === FIDÉLITÉ ===
-        loyalty = self._get_loyalty_data() if show_loyalty else None
-
         if loyalty:
             add("")
-            cmd(BOLD_ON + ALIGN_CENTER)
+            cmd(bold_on + receipt.ALIGN_CENTER)
             add("******** VOTRE COMPTE FIDÉLITÉ ********")
-            cmd(BOLD_OFF + ALIGN_LEFT)
+            cmd(bold_off + receipt.ALIGN_LEFT)
 
             add(f"Numéro Carte: {loyalty['card_number']}")
-            add(separator("-"))
+            receipt.separator()
 
             # Points précédents
             if (
@@ -714,28 +613,20 @@ class PosOrder(models.Model):
                 loyalty.get("current_points") is not None
                 and loyalty["current_points"] > 0
             ):
-                cmd(BOLD_ON)
+                cmd(bold_on)
                 add(f"Nouveau solde: {loyalty['current_points']:.1f} pts")
-                cmd(BOLD_OFF)
+                cmd(bold_off)
         else:
-            add("")
-            cmd(ALIGN_CENTER + BOLD_ON)
-            add("*** PAS DE CARTE FIDÉLITÉ ? ***")
-            cmd(BOLD_OFF)
-            add("Demandez votre carte, elle est gratuite!")
-            cmd(ALIGN_LEFT)
+            cmd(templates["no_loyalty"])
+
+        yield receipt.section()
 
         # === PIED DE PAGE ===
-        add("")
-        cmd(ALIGN_CENTER)
-        add(footer_message)
-        add(goodbye_message)
+        cmd(templates["footer"])
 
         # === CODE-BARRES ===
         if print_barcode:
-            cmd(feed(1))
-            cmd(ALIGN_CENTER)
-            cmd(feed(1))
+            cmd(templates["barcode_prefix"])
 
             # Utiliser barcode_value si disponible, sinon générer
             barcode_data = getattr(self, "barcode_value", None)
@@ -744,8 +635,7 @@ class PosOrder(models.Model):
                 cmd(barcode_ean13(barcode_data))
 
         # === COUPE PAPIER ===
-        cmd(feed(4))
-        cmd(CUT_PAPER)
+        cmd(templates["cut"])
 
         # === OUVRIR TIROIR CAISSE ===
         # si payment_id.payment_method_id.name == "Especes": lancer ouverture tiroir caisse
@@ -755,13 +645,10 @@ class PosOrder(models.Model):
                     payment.payment_method_id.name
                     and payment.payment_method_id.name.lower() == "cash"
                 ):
-                    try:
-                        cmd(OPEN_CASH_DRAWER)
-                    except Exception:
-                        cmd(OPEN_CASH_DRAWER_ALTERNATIVE)
+                    cmd(receipt.OPEN_CASH_DRAWER)
                     break
 
-        return bytes(output)
+        yield receipt.section()
 
     def _generate_barcode_data(self):
         """Génère les données du code-barres EAN-13"""
@@ -771,10 +658,143 @@ class PosOrder(models.Model):
         order_id_str = str(self.id).zfill(4)[-4:]
         return f"{store_id}{register_num}{date_str}{order_id_str}"
 
+    def _get_direct_print_etag(self):
+        """
+        Empreinte du ticket (ETag HTTP) : change dès que la commande, ses
+        lignes, ses paiements, son instantané fidélité, la caisse, la société
+        ou la version du module changent.
+        """
+        self.ensure_one()
+        return self._get_direct_print_etags()[self.id]
+
+    def _get_direct_print_etags(self):
+        """Empreintes de plusieurs commandes : {id de commande: ETag}"""
+        version = get_manifest("pos_direct_print").get("version")
+        logo_checksums = {
+            config.id: config.company_id._get_direct_print_logo_checksum()
+            if config.direct_print_logo
+            else None
+            for config in self.config_id
+        }
+        # Lignes et paiements : modifiés sans toucher à la commande
+        self.lines.mapped("write_date")
+        self.payment_ids.mapped("write_date")
+        etags = {}
+        for order in self:
+            config = order.config_id
+            company = config.company_id
+            parts = (
+                version,
+                order.id,
+                order.write_date,
+                order.lines.ids,
+                max(order.lines.mapped("write_date"), default=None),
+                order.payment_ids.ids,
+                max(order.payment_ids.mapped("write_date"), default=None),
+                config.write_date,
+                company.write_date,
+                company.partner_id.write_date,
+                logo_checksums[config.id],
+                order.direct_print_loyalty,
+            )
+            etags[order.id] = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return etags
+
+    def _get_direct_print_receipt(self):
+        """
+        Ticket ESC/POS de la commande, servi depuis le cache partagé
+        (pos.direct.print.receipt) : généré une seule fois tant que la
+        commande n'a pas changé.
+        """
+        self.ensure_one()
+        return self._get_direct_print_receipts()[self.id]
+
+    def _get_direct_print_receipts(self):
+        """Tickets de plusieurs commandes : {id de commande: bytes ESC/POS}"""
+        return self.env["pos.direct.print.receipt"].sudo()._get_receipts(self)
+
+    def _invalidate_direct_print_receipt(self):
+        """Oublie le ticket en cache de ces commandes"""
+        self.env["pos.direct.print.receipt"].sudo()._invalidate(self)
+
     @api.model
     def get_receipt_by_name(self, order_name):
         """Récupère une commande par son nom et génère le ticket."""
         order = self.search([("name", "=", order_name)], limit=1)
         if not order:
             return None
-        return order.generate_escpos_receipt()
+        return order._get_direct_print_receipt()
+
+    @api.model
+    def get_receipt_by_uuid(self, order_uuid):
+        """Récupère une commande par son uuid (indexé) et génère le ticket."""
+        order = self.search([("uuid", "=", order_uuid)], limit=1)
+        if not order:
+            return None
+        return order._get_direct_print_receipt()
+
+    @api.model
+    def get_direct_print_payload(self, order_name, order_uuid=None):
+        """
+        Ticket ESC/POS prêt à être envoyé tel quel à l'agent (message
+        print_raw), sans que l'agent ait à rappeler Odoo.
+        La commande est cherchée par uuid si fourni, sinon par nom.
+        Retourne {"data": base64, "sha256": empreinte hex, "etag": ETag HTTP}
+        ou False, avec logo_hash et logo_url si le logo est en mémoire NV de
+        l'imprimante. L'ETag permet à l'agent de revalider sa copie avant
+        une réimpression.
+        """
+        if order_uuid:
+            order = self.search([("uuid", "=", order_uuid)], limit=1)
+        else:
+            order = self.search([("name", "=", order_name)], limit=1)
+        receipt_data = order._get_direct_print_receipt() if order else None
+        if not receipt_data:
+            return False
+        payload = {
+            "data": base64.b64encode(receipt_data).decode("ascii"),
+            "sha256": hashlib.sha256(receipt_data).hexdigest(),
+            # Calculé après le rendu (qui a pu figer l'instantané fidélité),
+            # sous la forme de l'en-tête ETag des routes /pos_direct_print/order
+            "etag": f'"{order._get_direct_print_etag()}"',
+        }
+        nv_logo = order.config_id._get_direct_print_nv_logo()
+        if nv_logo:
+            payload["logo_hash"], payload["logo_url"] = nv_logo
+        return payload
+
+
+class PosOrderLine(models.Model):
+    _inherit = "pos.order.line"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines.order_id._invalidate_direct_print_receipt()
+        return lines
+
+    def write(self, vals):
+        self.order_id._invalidate_direct_print_receipt()
+        return super().write(vals)
+
+    def unlink(self):
+        self.order_id._invalidate_direct_print_receipt()
+        return super().unlink()
+
+
+class PosPayment(models.Model):
+    _inherit = "pos.payment"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        payments = super().create(vals_list)
+        payments.pos_order_id._invalidate_direct_print_receipt()
+        return payments
+
+    def write(self, vals):
+        self.pos_order_id._invalidate_direct_print_receipt()
+        return super().write(vals)
+
+    def unlink(self):
+        self.pos_order_id._invalidate_direct_print_receipt()
+        return super().unlink()
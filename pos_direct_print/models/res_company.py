@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+from odoo.tools import lru
+import base64
+import hashlib
+
+from .escpos import convert_image_to_raster, define_nv_graphics, print_raster_image
+from .pos_config import _TEMPLATE_CACHE, TEMPLATE_COMPANY_FIELDS
+
+# Cache du logo déjà rasterisé (bloc GS v 0 ou GS ( L complet), par worker.
+# Clé : (base, société, empreinte du logo, largeur max, commande)
+_LOGO_RASTER_CACHE = lru.LRU(32)
+
+
+class ResCompany(models.Model):
+    _inherit = "res.company"
+
+    # Empreinte du logo, recalculée seulement quand il change : les caches
+    # des tickets la lisent comme un champ, sans rechercher la pièce jointe
+    direct_print_logo_checksum = fields.Char(
+        compute="_compute_direct_print_logo_checksum", store=True
+    )
+
+    @api.depends("partner_id.image_1920")
+    def _compute_direct_print_logo_checksum(self):
+        """
+        Empreinte lue sur la pièce jointe (sans charger l'image).
+        Le logo de la société est l'image de son partenaire.
+        """
+        attachments = (
+            self.env["ir.attachment"]
+            .sudo()
+            .search(
+                [
+                    ("res_model", "=", "res.partner"),
+                    ("res_field", "=", "image_1920"),
+                    ("res_id", "in", self.partner_id.ids),
+                ]
+            )
+        )
+        checksum_by_partner = {att.res_id: att.checksum for att in attachments}
+        for company in self:
+            checksum = checksum_by_partner.get(company.partner_id.id)
+            if not checksum and company.logo:
+                # Logo stocké autrement (version / configuration différente)
+                checksum = hashlib.sha1(company.logo).hexdigest()
+            company.direct_print_logo_checksum = checksum or False
+
+    def _get_direct_print_logo_checksum(self):
+        """Empreinte du logo (champ stocké), ou None sans logo"""
+        self.ensure_one()
+        return self.direct_print_logo_checksum or None
+
+    def _get_direct_print_logo_raster(self, max_width=384):
+        """
+        Retourne le logo prêt à imprimer (commande GS v 0 + données raster),
+        ou b"" si la société n'a pas de logo exploitable.
+        Le calcul n'est fait qu'une fois par logo et par worker.
+        """
+        return self._get_direct_print_logo_command(print_raster_image, max_width)
+
+    def _get_direct_print_nv_logo_definition(self, max_width=384):
+        """
+        Retourne la commande d'enregistrement du logo en mémoire NV de
+        l'imprimante (GS ( L), ou b"" si la société n'a pas de logo exploitable.
+        """
+        return self._get_direct_print_logo_command(define_nv_graphics, max_width)
+
+    def _get_direct_print_logo_command(self, build, max_width):
+        """Commande ESC/POS `build(image, largeur en octets, hauteur)` du logo"""
+        self.ensure_one()
+        checksum = self._get_direct_print_logo_checksum()
+        if not checksum:
+            return b""
+
+        key = (self.env.cr.dbname, self.id, checksum, max_width, build.__name__)
+        command = _LOGO_RASTER_CACHE.get(key)
+        if command is None:
+            result = convert_image_to_raster(base64.b64decode(self.logo), max_width)
+            command = build(*result) if result else b""
+            _LOGO_RASTER_CACHE[key] = command
+        return command
+
+    def write(self, vals):
+        if "logo" in vals:
+            _LOGO_RASTER_CACHE.clear()
+        if TEMPLATE_COMPANY_FIELDS.intersection(vals):
+            _TEMPLATE_CACHE.clear()
+        return super().write(vals)
@@ -7,16 +7,51 @@
 
 import { patch } from "@web/core/utils/patch";
 import { PaymentScreen } from "@point_of_sale/app/screens/payment_screen/payment_screen";
+import { PrintConnection } from "@pos_direct_print/js/print_connection";
 
 // Valeurs par défaut (utilisées si config Odoo non disponible)
 const DEFAULT_CONFIG = {
     HTTP_PORT: 8766,
     WS_PORT: 8765,
     TIMEOUT: 3000,
+    DISCOVERY_TTL: 24 * 3600 * 1000, // Durée de validité de l'URL mémorisée
 };
 
+// États d'une commande finalisée (voir PAID_STATES côté pos.order)
+const PAID_STATES = ["paid", "done", "invoiced"];
+
+// Clé localStorage de l'URL découverte (conservée entre deux chargements du POS)
+const DISCOVERY_STORAGE_KEY = "pos_direct_print.server_url";
+
 // Cache pour l'URL du serveur
 let cachedServerUrl = null;
+// Revalidation en tâche de fond déjà lancée pour ce chargement
+let revalidating = false;
+
+function loadStoredServerUrl() {
+    try {
+        const stored = JSON.parse(localStorage.getItem(DISCOVERY_STORAGE_KEY));
+        if (stored && Date.now() - stored.time < DEFAULT_CONFIG.DISCOVERY_TTL) {
+            return stored.url;
+        }
+    } catch {
+        // Entrée absente ou illisible : nouvelle découverte
+    }
+    return null;
+}
+
+function storeServerUrl(url) {
+    cachedServerUrl = url;
+    try {
+        if (url) {
+            localStorage.setItem(DISCOVERY_STORAGE_KEY, JSON.stringify({ url, time: Date.now() }));
+        } else {
+            localStorage.removeItem(DISCOVERY_STORAGE_KEY);
+        }
+    } catch {
+        // localStorage indisponible (navigation privée) : cache mémoire seul
+    }
+}
 
 patch(PaymentScreen.prototype, {
     
@@ -35,10 +70,13 @@ patch(PaymentScreen.prototype, {
     },
 
     async validateOrder(isForceValidate) {
+        // Commande de l'écran de paiement, avant que super n'en change
+        const order = this.currentOrder;
         await super.validateOrder(isForceValidate);
 
-        const order = this.pos.get_order();
-        if (!order) return;
+        // Validation interrompue (commande invalide, paiement refusé,
+        // confirmation annulée...) : la commande reste en brouillon
+        if (!order || !this._isOrderPaid(order)) return;
 
         // Vérifier si l'impression directe est activée
         const printConfig = this._getDirectPrintConfig();
@@ -47,78 +85,166 @@ patch(PaymentScreen.prototype, {
             return;
         }
 
-        // Attendre que les données soient enregistrées dans Odoo
-        await new Promise(resolve => setTimeout(resolve, 500));
-        
-        this._printReceipt(order.name, printConfig);
+        // super.validateOrder attend la synchronisation de la commande :
+        // on imprime dès la réponse du serveur, sans délai fixe
+        const message = await this._buildPrintMessage(order);
+        this._printReceipt(message, printConfig);
+    },
+
+    /**
+     * Commande finalisée (payée) : un id numérique ne suffit pas, les
+     * brouillons (restaurant) sont déjà enregistrés côté serveur
+     */
+    _isOrderPaid(order) {
+        return PAID_STATES.includes(order.state);
+    },
+
+    /**
+     * Commande enregistrée côté serveur : les enregistrements créés
+     * localement ont un id provisoire (chaîne) jusqu'à la synchronisation
+     */
+    _isOrderSynced(order) {
+        return typeof order.id === "number";
+    },
+
+    /**
+     * Prépare le message pour l'agent : ticket ESC/POS inclus (print_raw),
+     * obtenu en un seul appel à Odoo, sinon simple demande (print).
+     * La commande est désignée par son uuid (indexé côté serveur), le nom
+     * ne sert qu'à l'affichage.
+     * Commande non synchronisée (hors ligne, serveur lent) : l'agent
+     * réessaie lui-même tant qu'Odoo répond 404.
+     */
+    async _buildPrintMessage(order) {
+        const printRequest = {
+            type: "print",
+            order_name: order.name,
+            order_uuid: order.uuid,
+        };
+        if (!this._isOrderSynced(order)) {
+            console.warn("⚠ Commande non synchronisée, l'agent récupérera le ticket:", order.name);
+            return printRequest;
+        }
+        try {
+            const payload = await this.env.services.orm.call(
+                "pos.order",
+                "get_direct_print_payload",
+                [order.name, order.uuid]
+            );
+            if (payload) {
+                return {
+                    ...printRequest,
+                    type: "print_raw",
+                    data: payload.data,
+                    sha256: payload.sha256,
+                    // Revalidation de la copie en cache avant réimpression
+                    etag: payload.etag,
+                    // Logo en mémoire NV de l'imprimante (absent sinon)
+                    logo_hash: payload.logo_hash,
+                    logo_url: payload.logo_url,
+                };
+            }
+        } catch (error) {
+            console.warn("⚠ Ticket non obtenu depuis Odoo, l'agent le récupérera:", error);
+        }
+        return printRequest;
     },
 
     /**
-     * Découvre le serveur d'impression via l'API HTTP
+     * Découvre le serveur d'impression via l'API HTTP.
+     * L'URL mémorisée (localStorage) est utilisée tout de suite et revérifiée
+     * en tâche de fond : un rechargement du POS ne retarde pas le ticket.
      */
     async _discoverPrintServer(config) {
+        if (!cachedServerUrl) {
+            cachedServerUrl = loadStoredServerUrl();
+        }
         if (cachedServerUrl) {
+            if (!revalidating) {
+                revalidating = true;
+                this._probePrintServers(config).then(
+                    (url) => url && storeServerUrl(url)
+                );
+            }
             return cachedServerUrl;
         }
 
+        const url = await this._probePrintServers(config);
+        if (url) {
+            storeServerUrl(url);
+            console.log("✓ Serveur d'impression trouvé:", url);
+            return url;
+        }
+
+        // Fallback: construire l'URL depuis la config
+        const fallbackUrl = `ws://${config.host}:${config.wsPort}`;
+        console.warn("⚠ Serveur non détecté via /info, fallback:", fallbackUrl);
+        return fallbackUrl;
+    },
+
+    /**
+     * Interroge /info sur tous les candidats en parallèle.
+     * Retourne l'URL WebSocket du premier qui répond, ou null.
+     */
+    async _probePrintServers(config) {
         const ipsToTry = [
             "localhost",
             "127.0.0.1",
-        ].filter((v, i, a) => a.indexOf(v) === i); // Dédupliquer
+            config.host,
+        ].filter((v, i, a) => v && a.indexOf(v) === i); // Dédupliquer
 
-        for (const ip of ipsToTry) {
+        const probe = async (ip) => {
+            const controller = new AbortController();
+            const timer = setTimeout(() => controller.abort(), config.timeout);
             try {
-                const response = await Promise.race([
-                    fetch(`http://${ip}:${config.httpPort}/info`),
-                    new Promise((_, reject) => 
-                        setTimeout(() => reject(new Error("Timeout")), config.timeout)
-                    )
-                ]);
-
-                if (response.ok) {
-                    const info = await response.json();
-                    cachedServerUrl = info.websocket_url;
-                    console.log("✓ Serveur d'impression trouvé:", cachedServerUrl);
-                    return cachedServerUrl;
+                const response = await fetch(`http://${ip}:${config.httpPort}/info`, {
+                    signal: controller.signal,
+                });
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
                 }
-            } catch (e) {
-                // Continuer avec la prochaine IP
+                const info = await response.json();
+                return info.websocket_url;
+            } finally {
+                clearTimeout(timer);
             }
+        };
+
+        try {
+            return await Promise.any(ipsToTry.map(probe));
+        } catch {
+            // Aucun candidat n'a répondu
+            return null;
         }
+    },
 
-        // Fallback: construire l'URL depuis la config
-        const fallbackUrl = `ws://${config.host}:${config.wsPort}`;
-        console.warn("⚠ Serveur non détecté via /info, fallback:", fallbackUrl);
-        return fallbackUrl;
+    /**
+     * Connexion persistante vers l'agent, partagée par toute la session POS
+     */
+    _getPrintConnection(config) {
+        if (!this.pos.directPrintConnection) {
+            this.pos.directPrintConnection = new PrintConnection(
+                () => this._discoverPrintServer(config),
+                () => {
+                    storeServerUrl(null);
+                    revalidating = false;
+                }
+            );
+        }
+        return this.pos.directPrintConnection;
     },
 
     /**
      * Envoie une demande d'impression au serveur
      */
-    async _printReceipt(orderName, config) {
+    async _printReceipt(message, config) {
         try {
-            const wsUrl = await this._discoverPrintServer(config);
-            const ws = new WebSocket(wsUrl);
-
-            ws.onopen = () => {
-                const payload = { type: "print", order_name: orderName };
-                ws.send(JSON.stringify(payload));
-                console.log("✓ Impression demandée:", orderName);
-                // Fermer après un court délai pour s'assurer que le message est envoyé
-                setTimeout(() => ws.close(), 100);
-            };
-
-            ws.onerror = (error) => {
-                console.error("✗ Erreur WebSocket:", error);
-                cachedServerUrl = null;
-            };
-
-            ws.onclose = () => {
-                // Connexion fermée normalement
-            };
+            const connection = this._getPrintConnection(config);
+            console.log("✓ Impression demandée:", message.order_name);
+            await connection.request(message);
+            console.log("✓ Ticket imprimé:", message.order_name);
         } catch (error) {
-            console.error("✗ Erreur d'impression:", error);
-            cachedServerUrl = null;
+            console.error("✗ Erreur d'impression:", message.order_name, error);
         }
     }
 });
@@ -0,0 +1,223 @@
+/** @odoo-module */
+
+/**
+ * Connexion WebSocket persistante vers l'agent d'impression
+ *
+ * Une seule connexion par session POS, rétablie automatiquement avec un
+ * délai croissant. Chaque demande porte un request_id : l'agent le renvoie
+ * dans ses accusés (queued, done, failed), ce qui permet d'avoir plusieurs
+ * impressions en cours. La table des demandes en attente pilote les renvois.
+ * Chaque demande a une échéance absolue : passée, elle est abandonnée avec
+ * une erreur, même si l'agent est resté injoignable tout ce temps.
+ */
+
+const DEFAULT_OPTIONS = {
+    ACK_TIMEOUT: 5000, // Délai max avant l'accusé "queued" de l'agent
+    MAX_ATTEMPTS: 3, // Envois max d'une même demande
+    REQUEST_TIMEOUT: 30000, // Délai max d'une demande, reconnexions comprises
+    MIN_BACKOFF: 500,
+    MAX_BACKOFF: 10000,
+};
+
+export class PrintConnection {
+    /**
+     * @param {Function} resolveUrl fonction async retournant l'URL WebSocket
+     * @param {Function} onUrlFailure appelée quand l'URL ne répond plus
+     */
+    constructor(resolveUrl, onUrlFailure = () => {}, options = {}) {
+        this.resolveUrl = resolveUrl;
+        this.onUrlFailure = onUrlFailure;
+        this.options = { ...DEFAULT_OPTIONS, ...options };
+        this.ws = null;
+        this.connecting = false;
+        this.backoff = this.options.MIN_BACKOFF;
+        this.reconnectTimer = null;
+        this.counter = 0;
+        this.sessionId = Date.now().toString(36);
+        // request_id -> { message, attempts, sent, queued, expiresAt,
+        //                 ackTimer, expiryTimer, resolve, reject }
+        this.pending = new Map();
+    }
+
+    /**
+     * Envoie une demande d'impression.
+     * La promesse est résolue avec l'accusé "done" et rejetée sur "failed"
+     * ou quand toutes les tentatives ont échoué.
+     */
+    request(message) {
+        const requestId = `${this.sessionId}-${++this.counter}`;
+        return new Promise((resolve, reject) => {
+            this.pending.set(requestId, {
+                message: { ...message, request_id: requestId },
+                attempts: 0,
+                sent: false,
+                queued: false,
+                expiresAt: Date.now() + this.options.REQUEST_TIMEOUT,
+                ackTimer: null,
+                expiryTimer: setTimeout(
+                    () => this._onExpired(requestId),
+                    this.options.REQUEST_TIMEOUT
+                ),
+                resolve,
+                reject,
+            });
+            this._flush();
+        });
+    }
+
+    _isOpen() {
+        return this.ws && this.ws.readyState === WebSocket.OPEN;
+    }
+
+    /**
+     * Envoie les demandes pas encore transmises (ou à renvoyer)
+     */
+    _flush() {
+        if (!this._isOpen()) {
+            this._connect();
+            return;
+        }
+        for (const [requestId, entry] of this.pending) {
+            if (entry.sent) {
+                continue;
+            }
+            if (Date.now() >= entry.expiresAt) {
+                this._onExpired(requestId);
+                continue;
+            }
+            entry.sent = true;
+            entry.attempts++;
+            this.ws.send(JSON.stringify(entry.message));
+            entry.ackTimer = setTimeout(
+                () => this._onAckTimeout(requestId),
+                this.options.ACK_TIMEOUT
+            );
+        }
+    }
+
+    async _connect() {
+        if (this.connecting || this.reconnectTimer || this._isOpen()) {
+            return;
+        }
+        this.connecting = true;
+        try {
+            const url = await this.resolveUrl();
+            const ws = new WebSocket(url);
+            this.ws = ws;
+            ws.onopen = () => {
+                this.connecting = false;
+                this.backoff = this.options.MIN_BACKOFF;
+                this._flush();
+            };
+            ws.onmessage = (event) => this._onMessage(event);
+            ws.onerror = () => {
+                // onclose suit toujours onerror : la reconnexion y est gérée
+                this.onUrlFailure();
+            };
+            ws.onclose = () => this._onClose(ws);
+        } catch (error) {
+            console.error("✗ Connexion à l'agent impossible:", error);
+            this.connecting = false;
+            this.onUrlFailure();
+            this._scheduleReconnect();
+        }
+    }
+
+    _onClose(ws) {
+        if (this.ws !== ws) {
+            return;
+        }
+        this.ws = null;
+        this.connecting = false;
+        for (const [requestId, entry] of this.pending) {
+            clearTimeout(entry.ackTimer);
+            if (entry.queued) {
+                // L'agent a déjà le travail : il l'imprimera sans pouvoir
+                // nous prévenir, on ne le renvoie pas (pas de double ticket)
+                this._remove(requestId);
+                entry.resolve({ request_id: requestId, status: "queued" });
+            } else {
+                entry.sent = false;
+            }
+        }
+        this._scheduleReconnect();
+    }
+
+    _scheduleReconnect() {
+        if (this.reconnectTimer) {
+            return;
+        }
+        const delay = this.backoff;
+        this.backoff = Math.min(this.backoff * 2, this.options.MAX_BACKOFF);
+        this.reconnectTimer = setTimeout(() => {
+            this.reconnectTimer = null;
+            this._connect();
+        }, delay);
+    }
+
+    _onAckTimeout(requestId) {
+        const entry = this.pending.get(requestId);
+        if (!entry || entry.queued) {
+            return;
+        }
+        if (entry.attempts >= this.options.MAX_ATTEMPTS) {
+            this._remove(requestId);
+            entry.reject(new Error("Pas de réponse de l'agent d'impression"));
+            return;
+        }
+        entry.sent = false;
+        this._flush();
+    }
+
+    /**
+     * Échéance de la demande passée : abandonnée avec une erreur, sauf si
+     * l'agent l'a déjà acceptée (il l'imprimera, on ne la renvoie pas)
+     */
+    _onExpired(requestId) {
+        const entry = this.pending.get(requestId);
+        if (!entry) {
+            return;
+        }
+        this._remove(requestId);
+        if (entry.queued) {
+            entry.resolve({ request_id: requestId, status: "queued" });
+        } else {
+            entry.reject(new Error("Délai dépassé : agent d'impression injoignable"));
+        }
+    }
+
+    /**
+     * Retire une demande de la table et arrête ses minuteries
+     */
+    _remove(requestId) {
+        const entry = this.pending.get(requestId);
+        if (entry) {
+            clearTimeout(entry.ackTimer);
+            clearTimeout(entry.expiryTimer);
+            this.pending.delete(requestId);
+        }
+    }
+
+    _onMessage(event) {
+        let ack;
+        try {
+            ack = JSON.parse(event.data);
+        } catch {
+            return;
+        }
+        const entry = this.pending.get(ack.request_id);
+        if (!entry) {
+            return;
+        }
+        clearTimeout(entry.ackTimer);
+        if (ack.status === "queued") {
+            entry.queued = true;
+        } else if (ack.status === "done") {
+            this._remove(ack.request_id);
+            entry.resolve(ack);
+        } else if (ack.status === "failed") {
+            this._remove(ack.request_id);
+            entry.reject(new Error(ack.error || "Échec d'impression"));
+        }
+    }
+}
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import BaseCase, tagged
+
+from odoo.addons.pos_direct_print.models import escpos
+
+
+@tagged("post_install", "-at_install")
+class TestEscposEncoding(BaseCase):
+    """
+    ReceiptBuilder doit produire les mêmes octets que l'ancien encodeur
+    (str.encode(page de code, errors="replace")) pour chaque page de code.
+    """
+
+    ENCODINGS = ["cp437", "cp850", "cp858", "cp1252", "utf-8"]
+    COMMANDS = ["BOLD_ON", "BOLD_OFF", "ALIGN_LEFT", "ALIGN_CENTER", "OPEN_CASH_DRAWER"]
+
+    @staticmethod
+    def _legacy(command, encoding):
+        """Encodeur d'origine de pos.order (cmd/to_bytes)"""
+        return str(command).encode(encoding, errors="replace")
+
+    def test_commands_match_legacy_encoder(self):
+        for encoding in self.ENCODINGS:
+            receipt = escpos.ReceiptBuilder(42, encoding)
+            for name in self.COMMANDS:
+                with self.subTest(encoding=encoding, command=name):
+                    self.assertEqual(
+                        getattr(receipt, name),
+                        self._legacy(getattr(escpos, name), encoding),
+                    )
+
+    def test_command_str_uses_receipt_encoding(self):
+        barcode = escpos.barcode_ean13("2000000001234")
+        for encoding in self.ENCODINGS:
+            receipt = escpos.ReceiptBuilder(42, encoding)
+            receipt.command(barcode)
+            receipt.command(escpos.OPEN_CASH_DRAWER)
+            with self.subTest(encoding=encoding):
+                self.assertEqual(
+                    receipt.section(),
+                    self._legacy(barcode, encoding)
+                    + self._legacy(escpos.OPEN_CASH_DRAWER, encoding),
+                )
+
+    def test_cash_drawer_cp437(self):
+        # Le paramètre \xfa part en 0xA3 en cp437, comme avant le pré-encodage
+        receipt = escpos.ReceiptBuilder(42, "cp437")
+        self.assertEqual(receipt.OPEN_CASH_DRAWER, b"\x1bp\x00\x19\xa3")
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from odoo.addons.point_of_sale.tests.common import TestPoSCommon
+from odoo.tests import tagged
+
+
+@tagged("post_install", "-at_install")
+class TestReceiptQueries(TestPoSCommon):
+    """
+    Nombre de requêtes du rendu des tickets : il ne doit dépendre ni du
+    nombre de commandes ni du nombre de lignes (lectures groupées, voir
+    pos.order._prefetch_direct_print_data).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.basic_config.direct_print_show_loyalty = True
+        cls.products = [
+            cls.create_product(f"Produit {i}", cls.categ_basic, 10.0 + i)
+            for i in range(30)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.config = self.basic_config
+        self.open_new_session()
+
+    def _create_paid_orders(self, count, n_lines=30):
+        """Commandes payées avec client et n_lines lignes chacune"""
+        orders = self._create_orders([
+            {
+                "pos_order_lines_ui_args": [
+                    (product, 2) for product in self.products[:n_lines]
+                ],
+                "customer": self.customer,
+            }
+            for _ in range(count)
+        ])
+        return self.env["pos.order"].concat(*orders.values())
+
+    def _count_queries(self, func):
+        """Requêtes exécutées par func, caches de l'ORM vidés"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        start = self.cr.sql_log_count
+        func()
+        self.env.flush_all()
+        return self.cr.sql_log_count - start
+
+    def test_render_queries_independent_of_order_count(self):
+        # Premier rendu : caches des gabarits remplis, instantanés figés
+        self._create_paid_orders(1).generate_escpos_receipts()
+
+        single = self._create_paid_orders(1, n_lines=1)
+        single.generate_escpos_receipts()
+        expected = self._count_queries(single.generate_escpos_receipts)
+
+        orders = self._create_paid_orders(10)
+        orders.generate_escpos_receipts()
+        self.env.invalidate_all()
+        with self.assertQueryCount(expected):
+            receipts = orders.generate_escpos_receipts()
+        self.assertEqual(set(receipts), set(orders.ids))
+        self.assertTrue(all(receipts.values()))
+
+    def test_first_render_queries_independent_of_order_count(self):
+        # Premier rendu après paiement : fidélité non figée calculée en lot
+        self._create_paid_orders(1).generate_escpos_receipts()
+
+        single = self._create_paid_orders(1)
+        expected = self._count_queries(single.generate_escpos_receipts)
+
+        orders = self._create_paid_orders(10)
+        self.env.invalidate_all()
+        with self.assertQueryCount(expected):
+            orders.generate_escpos_receipts()
+
+    def test_snapshot_stored_at_payment_not_at_render(self):
+        orders = self._create_paid_orders(3, n_lines=1)
+        self.assertTrue(all(orders.mapped("direct_print_loyalty")))
+        self.env.flush_all()
+        before = {
+            order.id: (order.write_date, order.direct_print_loyalty)
+            for order in orders
+        }
+
+        # Le rendu est en lecture seule : ni instantané ni write_date modifiés
+        orders.generate_escpos_receipts()
+        self.env.flush_all()
+        self.env.invalidate_all()
+        for order in orders:
+            self.assertEqual(
+                (order.write_date, order.direct_print_loyalty), before[order.id]
+            )
+
+    def test_store_loyalty_snapshots_single_query(self):
+        orders = self._create_paid_orders(10, n_lines=1)
+        snapshots = {
+            order.id: {"data": {"card_number": f"C{order.id}"}, "final": True}
+            for order in orders
+        }
+        orders.mapped("direct_print_loyalty")
+        self.env.flush_all()
+        self.cr.execute(
+            "UPDATE pos_order SET write_date = '2000-01-01' WHERE id IN %s",
+            [tuple(orders.ids)],
+        )
+        orders.invalidate_recordset(["write_date"])
+        orders.mapped("write_date")
+        with self.assertQueryCount(1):
+            orders._store_loyalty_snapshots(snapshots)
+        for order in orders:
+            self.assertEqual(order.direct_print_loyalty, snapshots[order.id])
+            # Instantané modifié : write_date suit (l'ETag en dépend)
+            self.assertGreater(order.write_date.year, 2000)
+
+        # Instantanés inchangés : aucune écriture
+        with self.assertQueryCount(0):
+            orders._store_loyalty_snapshots(snapshots)
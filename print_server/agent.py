@@ -5,17 +5,24 @@ Récupère les tickets formatés depuis Odoo et les envoie à l'imprimante.
 """
 
 import asyncio
-import json
 import socket
-import urllib.request
-import urllib.parse
 import websockets
 from aiohttp import web
 import os
 import argparse
 
-from .config import WEBSOCKET_CONFIG
+from .config import (
+    WEBSOCKET_CONFIG,
+    BACKEND_SYSTEM,
+    BACKEND_DEVICE,
+    BACKEND_NETWORK,
+    load_current_config,
+)
+from .dispatcher import RequestDispatcher
 from .printer import Printer
+from .nv_logos import NvLogoStore
+from .odoo_client import OdooClient
+from .spooler import PrintSpooler
 
 
 def get_local_ip():
@@ -33,7 +40,7 @@ def get_local_ip():
 class PrintAgent:
     """Agent léger d'impression - récupère les tickets depuis Odoo"""
 
-    def __init__(self, odoo_url=None):
+    def __init__(self, odoo_url=None, backend=None, device=None):
         # Déterminer l'URL Odoo : argument -> variable d'env -> saisie interactive
         self.odoo_url = odoo_url or os.environ.get('ODOO_URL')
         if not self.odoo_url:
@@ -43,71 +50,44 @@ class PrintAgent:
             except Exception:
                 self.odoo_url = None
 
-        # Détecter imprimante si config locale vide
-        self.printer = None
-        try:
-            detected = Printer.detect_printer()
-        except Exception:
-            detected = None
+        # Mode de connexion : argument -> config.json -> CUPS/Windows
+        saved = load_current_config()
+        backend = backend or saved.get("backend") or BACKEND_SYSTEM
+        device = device or saved.get("device")
+
+        # L'imprimante système est détectée automatiquement par Printer
+        self.printer = Printer(backend=backend, device=device)
+
+        # Logo en mémoire NV : empreinte détenue par l'imprimante courante
+        self.nv_logos = NvLogoStore(lambda: self.printer.printer_name)
+
+        # Session HTTP persistante vers Odoo (ouverte au démarrage)
+        self.odoo_client = OdooClient(self.odoo_url, log_callback=self._log)
+
+        # File d'attente d'impression (worker dédié à l'imprimante)
+        self.spooler = PrintSpooler(
+            self.printer,
+            log_callback=self._log,
+            nv_logos=self.nv_logos,
+            logo_loader=self.odoo_client.fetch_nv_logo,
+        )
+
+        # Messages du POS -> travaux d'impression
+        self.dispatcher = RequestDispatcher(self.spooler, self.odoo_client)
 
-        self.printer = Printer(detected)
+    def _log(self, message, level="info"):
+        """Journalisation console des étapes d'impression"""
+        print(f"   {message}")
 
-    def get_receipt_from_odoo(self, order_name):
+    async def get_receipt_from_odoo(self, order_name, order_uuid=None):
         """
         Récupère le ticket formaté (bytes ESC/POS) depuis Odoo.
         """
-        if not self.odoo_url:
-            print("   ✗ URL Odoo non fournie")
-            return None
-
-        try:
-            # Encoder le nom de commande pour l'URL
-            encoded_name = urllib.parse.quote(order_name, safe='')
-            url = f"{self.odoo_url}/pos_direct_print/receipt/{encoded_name}"
-            
-            print(f"   📡 Récupération: {url}")
-            
-            req = urllib.request.Request(url)
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.status == 200:
-                    return response.read()
-                else:
-                    print(f"   ✗ Erreur HTTP: {response.status}")
-                    return None
-                    
-        except urllib.error.HTTPError as e:
-            print(f"   ✗ Erreur HTTP {e.code}: {e.reason}")
-            return None
-        except Exception as e:
-            print(f"   ✗ Erreur: {e}")
-            return None
+        return await self.odoo_client.fetch_receipt(order_name, order_uuid)
 
     async def handle_connection(self, websocket):
         """Gère les connexions WebSocket entrantes"""
-        async for message in websocket:
-            try:
-                data = json.loads(message)
-                
-                if data.get("type") == "print":
-                    order_name = data.get("order_name")
-                    print(f"📥 Demande d'impression: {order_name}")
-                    
-                    # Récupérer le ticket depuis Odoo
-                    receipt_data = self.get_receipt_from_odoo(order_name)
-                    
-                    if receipt_data:
-                        # Imprimer directement les bytes ESC/POS
-                        if self.printer.print_raw(receipt_data):
-                            print(f"   ✓ Ticket imprimé: {order_name}")
-                        else:
-                            print(f"   ✗ Échec d'impression: {order_name}")
-                    else:
-                        print(f"   ✗ Ticket non récupéré: {order_name}")
-                        
-            except json.JSONDecodeError as e:
-                print(f"✗ Erreur JSON: {e}")
-            except Exception as e:
-                print(f"✗ Erreur: {e}")
+        await self.dispatcher.serve(websocket)
 
     async def start(self):
         """Démarre l'agent (WebSocket + HTTP info)"""
@@ -143,11 +123,21 @@ class PrintAgent:
         await site.start()
         print(f"✓ Serveur HTTP démarré sur le port {http_port}")
 
+        # Client HTTP vers Odoo
+        await self.odoo_client.start()
+        self.spooler.start()
+
         # Serveur WebSocket
-        async with websockets.serve(self.handle_connection, host, port):
-            print(f"✓ Serveur WebSocket démarré sur le port {port}")
-            print("✓ Agent prêt !")
-            await asyncio.Future()
+        try:
+            async with websockets.serve(self.handle_connection, host, port):
+                print(f"✓ Serveur WebSocket démarré sur le port {port}")
+                print("✓ Agent prêt !")
+                await asyncio.Future()
+        finally:
+            await self.spooler.stop()
+            await self.odoo_client.close()
+            self.printer.close()
+            await runner.cleanup()
 
     async def http_info(self, request):
         """Endpoint HTTP pour la découverte de l'agent"""
@@ -171,9 +161,12 @@ def main():
     """Point d'entrée principal"""
     parser = argparse.ArgumentParser(description='PrintAgent')
     parser.add_argument('--odoo-url', dest='odoo_url', help='URL base d\'Odoo (ex: http://host:8070)')
+    parser.add_argument('--backend', choices=[BACKEND_SYSTEM, BACKEND_DEVICE, BACKEND_NETWORK],
+                        help='Mode de connexion à l\'imprimante (défaut: config.json ou system)')
+    parser.add_argument('--device', help='Périphérique (ex: /dev/usb/lp0) ou adresse réseau (ex: 192.168.1.50:9100)')
     args = parser.parse_args()
 
-    agent = PrintAgent(odoo_url=args.odoo_url)
+    agent = PrintAgent(odoo_url=args.odoo_url, backend=args.backend, device=args.device)
     asyncio.run(agent.start())
 
 
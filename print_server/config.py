@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 # CONFIGURATION DE L'AGENT D'IMPRESSION
@@ -10,6 +11,49 @@ from pathlib import Path
 #     "url": "http://192.168.2.125:8070",
 # }
 
+# ============================================
+# CLIENT HTTP VERS ODOO
+# Session aiohttp persistante (keep-alive) partagée
+# par toutes les caisses connectées à l'agent
+# ============================================
+ODOO_CLIENT_CONFIG = {
+    "timeout": 10,  # Délai total d'une requête (secondes)
+    # Ticket reçu en flux : lu au rythme de l'imprimante, sans délai total ;
+    # seul le silence d'Odoo entre deux morceaux est limité
+    "read_timeout": 10,
+    "batch_timeout": 60,  # Délai d'une récupération groupée
+    "batch_size": 200,  # Tickets max par requête groupée (MAX_BATCH_SIZE d'Odoo)
+    "connect_timeout": 5,  # Délai d'établissement de la connexion
+    "pool_size": 8,  # Connexions simultanées max vers Odoo
+    "keepalive_timeout": 30,  # Durée de vie d'une connexion inactive
+    # Compression des tickets acceptée (décodée automatiquement par aiohttp) ;
+    # zstd n'est annoncé que si aiohttp sait le décoder (voir odoo_client)
+    "accept_encoding": ["zstd", "gzip", "deflate"],
+    # Commande pas encore enregistrée (404) : nouveaux essais rapprochés
+    "not_found_retries": 5,
+    "not_found_backoff": 0.1,  # Premier délai, doublé à chaque essai
+    "not_found_backoff_max": 1.0,
+}
+
+# ============================================
+# CACHE DES TICKETS (RÉIMPRESSIONS)
+# Derniers tickets imprimés, gardés en mémoire
+# ============================================
+RECEIPT_CACHE_CONFIG = {
+    "max_entries": 200,  # Nombre max de tickets
+    "max_bytes": 8 * 1024 * 1024,  # Taille totale max (octets)
+}
+
+# ============================================
+# DEMANDES DÉJÀ REÇUES (request_id)
+# Le POS renvoie une demande sans accusé ou après
+# une reconnexion : elle n'est pas imprimée deux fois
+# ============================================
+SEEN_REQUESTS_CONFIG = {
+    "ttl": 600,  # Durée de mémorisation d'un request_id (secondes)
+    "max_entries": 1000,
+}
+
 # ============================================
 # CONFIGURATION RÉSEAU LOCALE
 # ============================================
@@ -26,6 +70,37 @@ WEBSOCKET_CONFIG = {
 # ============================================
 # PRINTER_NAME = "POS80"
 ENCODING = "cp437"
+PRINT_TIMEOUT = 10  # Délai max d'envoi d'un travail à l'imprimante (secondes)
+
+# ============================================
+# MODE DE CONNEXION À L'IMPRIMANTE
+# "system" : CUPS (Linux) / spouleur Windows
+# "device" : écriture directe sur le périphérique,
+#            sans CUPS (ex: /dev/usb/lp0)
+# "network": imprimante Ethernet en TCP brut
+#            (port 9100 / JetDirect, ex: 192.168.1.50:9100)
+# ============================================
+BACKEND_SYSTEM = "system"
+BACKEND_DEVICE = "device"
+BACKEND_NETWORK = "network"
+DEFAULT_DEVICE = "/dev/usb/lp0"
+
+# Tout envoi (reconnexions comprises) tient dans PRINT_TIMEOUT : au-delà,
+# le spouleur attend la fin d'un envoi qu'il ne peut plus interrompre
+DEVICE_CONFIG = {
+    "send_budget": 8,  # Durée max d'écriture d'un travail (ou d'un morceau)
+}
+
+NETWORK_CONFIG = {
+    "port": 9100,  # Port par défaut si l'adresse n'en précise pas
+    "connect_timeout": 2,  # Délai de connexion (secondes)
+    "write_timeout": 8,  # Délai max d'écriture d'un morceau de ticket
+    "send_budget": 8,  # Durée max d'un envoi, reconnexions comprises
+    "retries": 3,  # Tentatives de connexion par travail (avant tout octet envoyé)
+    "backoff": 0.2,  # Délai initial entre deux tentatives (doublé à chaque fois)
+    "backoff_max": 1,
+    "keepalive_idle": 30,  # Sondes TCP keep-alive après 30 s d'inactivité
+}
 
 # ============================================
 # SAVE/LOAD CONFIG
@@ -34,4 +109,15 @@ ENCODING = "cp437"
 # sauvegardé dans un fichier local
 # ============================================
 CONFIG_DIR = Path.home() / ".pos_agent"
-CONFIG_FILE = CONFIG_DIR / "config.json"
\ No newline at end of file
+CONFIG_FILE = CONFIG_DIR / "config.json"
+# Empreinte du logo enregistré en mémoire NV de chaque imprimante
+NV_LOGOS_FILE = CONFIG_DIR / "nv_logos.json"
+
+
+def load_current_config():
+    """Retourne les derniers paramètres enregistrés (section "current")"""
+    try:
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            return json.load(f).get("current", {}) or {}
+    except (OSError, ValueError):
+        return {}
\ No newline at end of file
@@ -0,0 +1,199 @@
+# TRAITEMENT DES DEMANDES DU POS (AGENT CONSOLE ET INTERFACE GRAPHIQUE)
+
+import json
+import time
+from collections import OrderedDict
+
+from .config import SEEN_REQUESTS_CONFIG
+from .spooler import PrintJob, decode_raw_payload
+
+
+def _print_log(message, level="info"):
+    """Journalisation par défaut (console)"""
+    print(message)
+
+
+class _SeenRequest:
+    """Demande déjà reçue : ses travaux et la connexion à prévenir"""
+
+    __slots__ = ("received", "jobs", "notify")
+
+    def __init__(self, notify):
+        self.received = time.monotonic()
+        self.jobs = []
+        self.notify = notify
+
+
+class RequestDispatcher:
+    """
+    Transforme les messages WebSocket du POS en travaux d'impression.
+
+    Messages reconnus :
+      - trame binaire : ticket ESC/POS brut, imprimé tel quel
+      - print       : ticket récupéré depuis Odoo (en flux si possible)
+      - reprint     : copie en cache revalidée auprès d'Odoo
+      - print_raw   : ticket inclus dans le message (base64)
+      - print_batch : plusieurs tickets récupérés en une requête
+
+    Le POS renvoie une demande restée sans accusé ou interrompue par une
+    reconnexion : un request_id déjà reçu n'est pas remis en file, l'état
+    de ses travaux est renvoyé sur la nouvelle connexion.
+    """
+
+    def __init__(self, spooler, odoo_client, log_callback=None, config=None):
+        self.spooler = spooler
+        self.odoo_client = odoo_client
+        self.log_callback = log_callback or _print_log
+        self.config = dict(SEEN_REQUESTS_CONFIG, **(config or {}))
+        self._seen = OrderedDict()  # request_id -> _SeenRequest
+        self._handlers = {
+            "print": self._print,
+            "reprint": self._reprint,
+            "print_raw": self._print_raw,
+            "print_batch": self._print_batch,
+        }
+
+    async def serve(self, websocket):
+        """Traite les messages d'une connexion jusqu'à sa fermeture"""
+
+        async def notify(job):
+            await websocket.send(json.dumps(job.to_message()))
+
+        async for message in websocket:
+            try:
+                await self.dispatch(message, notify)
+            except json.JSONDecodeError as e:
+                self.log_callback(f"✗ Erreur JSON: {e}", "error")
+            except Exception as e:
+                self.log_callback(f"✗ Erreur: {e}", "error")
+
+    async def dispatch(self, message, notify):
+        """Traite un message ; `notify(job)` envoie les accusés au POS"""
+        # Trame binaire : ticket ESC/POS brut envoyé directement
+        if isinstance(message, bytes):
+            self.log_callback(f"📥 Ticket brut reçu ({len(message)} octets)")
+            await self.spooler.submit(PrintJob("(brut)", data=message, notify=notify))
+            return
+
+        data = json.loads(message)
+        handler = self._handlers.get(data.get("type"))
+        if not handler:
+            return
+
+        request_id = data.get("request_id")
+        if request_id is None:
+            await handler(data, notify, request_id)
+            return
+
+        self._forget_expired()
+        seen = self._seen.get(request_id)
+        if seen is not None:
+            await self._replay(request_id, seen, notify)
+            return
+
+        # Enregistrée avant tout await : un renvoi pendant la préparation
+        # (récupération du logo...) est reconnu comme doublon
+        seen = self._seen[request_id] = _SeenRequest(notify)
+
+        async def relay(job):
+            # Accusés envoyés à la dernière connexion qui a fait la demande
+            await seen.notify(job)
+
+        try:
+            seen.jobs.extend(await handler(data, relay, request_id))
+        except Exception:
+            # Demande non mise en file : un renvoi doit pouvoir aboutir
+            self._seen.pop(request_id, None)
+            raise
+
+    async def _replay(self, request_id, seen, notify):
+        """Doublon : renvoie l'état des travaux au lieu de les imprimer à nouveau"""
+        self.log_callback(f"⤷ Demande {request_id} déjà reçue, accusé renvoyé")
+        seen.notify = notify
+        for job in seen.jobs:
+            if job.status is not None:
+                await notify(job)
+
+    def _forget_expired(self):
+        """Oublie les request_id trop anciens (ou en surnombre)"""
+        limit = time.monotonic() - self.config["ttl"]
+        while self._seen:
+            oldest = next(iter(self._seen.values()))
+            if oldest.received >= limit and len(self._seen) < self.config["max_entries"]:
+                break
+            self._seen.popitem(last=False)
+
+    async def _print(self, data, notify, request_id):
+        order_name = data.get("order_name")
+        order_uuid = data.get("order_uuid")
+        self.log_callback(f"📥 Demande d'impression: {order_name}")
+
+        # Mettre en file : la récupération démarre tout de suite,
+        # l'impression est faite par le worker de l'imprimante
+        job = PrintJob(
+            order_name,
+            fetch=lambda: self.odoo_client.fetch_receipt(
+                order_name, order_uuid, job.uses_logo
+            ),
+            stream=lambda: self.odoo_client.stream_receipt(
+                order_name, order_uuid, job.uses_logo
+            ),
+            notify=notify,
+            request_id=request_id,
+        )
+        return [await self.spooler.submit(job)]
+
+    async def _reprint(self, data, notify, request_id):
+        order_name = data.get("order_name")
+        order_uuid = data.get("order_uuid")
+        self.log_callback(f"📥 Demande de réimpression: {order_name}")
+
+        # Copie en cache si la commande n'a pas changé ; récupérée à son
+        # tour, après l'impression qui a pu la mettre en cache
+        job = PrintJob(
+            order_name,
+            fetch=lambda: self.odoo_client.reprint_receipt(
+                order_name, order_uuid, job.uses_logo
+            ),
+            notify=notify,
+            request_id=request_id,
+            deferred=True,
+        )
+        return [await self.spooler.submit(job)]
+
+    async def _print_raw(self, data, notify, request_id):
+        order_name = data.get("order_name")
+        self.log_callback(f"📥 Ticket reçu du POS: {order_name}")
+
+        # Ticket inclus dans le message : pas d'appel à Odoo
+        try:
+            receipt_data = decode_raw_payload(data)
+        except ValueError as e:
+            job = await self.spooler.reject(
+                PrintJob(order_name, notify=notify, request_id=request_id),
+                f"{e}: {order_name}",
+            )
+            return [job]
+        # ETag fourni par Odoo : la copie sera revalidée avant réimpression
+        self.odoo_client.cache.put(order_name, receipt_data, data.get("etag"))
+        job = PrintJob(
+            order_name,
+            data=receipt_data,
+            notify=notify,
+            request_id=request_id,
+        )
+        # Logo en mémoire NV : envoyé par le worker si l'imprimante ne l'a pas
+        job.uses_logo(data.get("logo_hash"), data.get("logo_url"))
+        return [await self.spooler.submit(job)]
+
+    async def _print_batch(self, data, notify, request_id):
+        order_names = data.get("order_names") or []
+        self.log_callback(f"📥 Demande groupée: {len(order_names)} ticket(s)")
+
+        # Une seule requête vers Odoo, un travail par ticket
+        return await self.spooler.submit_batch(
+            order_names,
+            self.odoo_client.fetch_receipts,
+            notify=notify,
+            request_id=request_id,
+        )
@@ -16,8 +16,27 @@ import queue
 # Importer les modules de l'agent
 
 from .agent import get_local_ip
+from .dispatcher import RequestDispatcher
 from .printer import Printer
-from .config import WEBSOCKET_CONFIG, CONFIG_FILE, CONFIG_DIR
+from .nv_logos import NvLogoStore
+from .odoo_client import OdooClient
+from .spooler import PrintSpooler
+from .config import (
+    WEBSOCKET_CONFIG,
+    CONFIG_FILE,
+    CONFIG_DIR,
+    BACKEND_SYSTEM,
+    BACKEND_DEVICE,
+    BACKEND_NETWORK,
+    DEFAULT_DEVICE,
+)
+
+# Libellés des modes de connexion affichés dans l'interface
+BACKEND_LABELS = {
+    BACKEND_SYSTEM: "Système (CUPS / Windows)",
+    BACKEND_DEVICE: "Périphérique direct (USB)",
+    BACKEND_NETWORK: "Réseau TCP (port 9100)",
+}
 
 
 class PrintAgentGUI:
@@ -96,6 +115,29 @@ class PrintAgentGUI:
         )
         refresh_btn.grid(row=0, column=1)
 
+        # Mode de connexion
+        ttk.Label(config_frame, text="Connexion:").grid(
+            row=2, column=0, sticky=tk.W, padx=(0, 10)
+        )
+        backend_frame = ttk.Frame(config_frame)
+        backend_frame.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=5)
+        backend_frame.columnconfigure(1, weight=1)
+
+        self.backend_var = tk.StringVar(value=BACKEND_LABELS[BACKEND_SYSTEM])
+        self.backend_combo = ttk.Combobox(
+            backend_frame,
+            textvariable=self.backend_var,
+            values=list(BACKEND_LABELS.values()),
+            state="readonly",
+            width=28,
+        )
+        self.backend_combo.grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+
+        # Périphérique (mode direct) ou adresse hôte:port (mode réseau)
+        self.device_var = tk.StringVar(value=DEFAULT_DEVICE)
+        self.device_entry = ttk.Entry(backend_frame, textvariable=self.device_var)
+        self.device_entry.grid(row=0, column=1, sticky=(tk.W, tk.E))
+
         # === SECTION CONTRÔLE ===
         control_frame = ttk.LabelFrame(main_frame, text="Contrôle", padding="10")
         control_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -262,6 +304,13 @@ class PrintAgentGUI:
                 if saved_printer and saved_printer in self.printer_combo["values"]:
                     self.printer_var.set(saved_printer)
 
+                # Mode de connexion sauvegardé
+                saved_backend = current.get("backend") or BACKEND_SYSTEM
+                self.backend_var.set(
+                    BACKEND_LABELS.get(saved_backend, BACKEND_LABELS[BACKEND_SYSTEM])
+                )
+                self.device_var.set(current.get("device") or DEFAULT_DEVICE)
+
             except Exception as e:
                 self._log(f"Erreur lors du chargement de la config: {e}", "warning")
                 # Fallback sur le comportement par défaut
@@ -300,6 +349,10 @@ class PrintAgentGUI:
                 != self.odoo_url_var.get()
                 or config_data.get("current", {}).get("printer_name")
                 != self.printer_var.get()
+                or config_data.get("current", {}).get("backend")
+                != self._get_backend()
+                or config_data.get("current", {}).get("device")
+                != self.device_var.get()
             ):
                 history = config_data.get("history", [])
                 history.append(
@@ -312,6 +365,8 @@ class PrintAgentGUI:
                 config_data["current"] = {
                     "odoo_url": self.odoo_url_var.get(),
                     "printer_name": self.printer_var.get(),
+                    "backend": self._get_backend(),
+                    "device": self.device_var.get(),
                     "last_used": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 }
                 config_data["history"] = history
@@ -325,6 +380,26 @@ class PrintAgentGUI:
         except Exception as e:
             self._log(f"Impossible de sauvegarder la config: {e}", "warning")
 
+    def _get_backend(self):
+        """Retourne le mode de connexion sélectionné ("system", "device" ou "network")"""
+        for backend, label in BACKEND_LABELS.items():
+            if label == self.backend_var.get():
+                return backend
+        return BACKEND_SYSTEM
+
+    def _validate_printer(self):
+        """Vérifie qu'une imprimante ou un périphérique est renseigné"""
+        if self._get_backend() in (BACKEND_DEVICE, BACKEND_NETWORK):
+            if not self.device_var.get():
+                messagebox.showerror(
+                    "Erreur", "Veuillez indiquer le périphérique ou l'adresse"
+                )
+                return False
+        elif not self.printer_var.get():
+            messagebox.showerror("Erreur", "Veuillez sélectionner une imprimante")
+            return False
+        return True
+
     def _refresh_printers(self):
         """Rafraîchit la liste des imprimantes disponibles"""
         try:
@@ -355,14 +430,15 @@ class PrintAgentGUI:
             messagebox.showerror("Erreur", "Veuillez entrer l'URL Odoo")
             return
 
-        if not self.printer_var.get():
-            messagebox.showerror("Erreur", "Veuillez sélectionner une imprimante")
+        if not self._validate_printer():
             return
 
         try:
             self.agent = PrintAgentGUI_Wrapper(
                 odoo_url=self.odoo_url_var.get(),
                 printer_name=self.printer_var.get(),
+                backend=self._get_backend(),
+                device=self.device_var.get(),
                 log_callback=self._log_from_agent,
                 stats_callback=self._update_stats,
             )
@@ -429,13 +505,13 @@ class PrintAgentGUI:
 
     def _test_print(self):
         """Effectue un test d'impression"""
-        if not self.printer_var.get():
-            messagebox.showerror("Erreur", "Veuillez sélectionner une imprimante")
+        if not self._validate_printer():
             return
 
         try:
-            printer = Printer()
-            printer.printer_name = self.printer_var.get()
+            printer = Printer(backend=self._get_backend(), device=self.device_var.get())
+            if printer.backend is None:
+                printer.printer_name = self.printer_var.get()
 
             # Créer un ticket de test simple
             test_data = b"\x1b\x40"  # ESC @ - Initialiser
@@ -450,13 +526,15 @@ class PrintAgentGUI:
                     "cp437"
                 )
             )
-            test_data += f"Imprimante: {self.printer_var.get()}\n".encode("cp437")
+            test_data += f"Imprimante: {printer.printer_name}\n".encode("cp437")
             test_data += b"=" * 32 + b"\n\n"
             test_data += b"Si vous lisez ceci,\n"
             test_data += b"l'impression fonctionne!\n\n\n"
             test_data += b"\x1d\x56\x00"  # GS V 0 - Couper le papier
 
-            if printer.print_raw(test_data):
+            success = printer.print_raw(test_data)
+            printer.close()
+            if success:
                 self._log("✓ Test d'impression réussi", "success")
                 messagebox.showinfo("Succès", "Test d'impression envoyé!")
             else:
@@ -533,7 +611,10 @@ class PrintAgentGUI:
             info = f"WebSocket: ws://{local_ip}:{ws_port}\n"
             info += f"HTTP API: http://{local_ip}:{http_port}\n"
             info += f"Odoo: {self.odoo_url_var.get()}\n"
-            info += f"Imprimante: {self.printer_var.get()}"
+            if self._get_backend() in (BACKEND_DEVICE, BACKEND_NETWORK):
+                info += f"Périphérique: {self.device_var.get()}"
+            else:
+                info += f"Imprimante: {self.printer_var.get()}"
 
             self.info_text.config(state=tk.NORMAL)
             self.info_text.delete(1.0, tk.END)
@@ -576,15 +657,44 @@ class PrintAgentGUI:
 class PrintAgentGUI_Wrapper:
     """Wrapper de l'agent pour l'intégrer à l'interface graphique"""
 
-    def __init__(self, odoo_url, printer_name, log_callback, stats_callback):
+    def __init__(
+        self,
+        odoo_url,
+        printer_name,
+        log_callback,
+        stats_callback,
+        backend=BACKEND_SYSTEM,
+        device=None,
+    ):
         self.odoo_url = odoo_url
-        self.printer_name = printer_name
         self.log_callback = log_callback
         self.stats_callback = stats_callback
 
-        # Créer le printer avec le nom spécifié
-        self.printer = Printer()
-        self.printer.printer_name = printer_name
+        # Créer le printer avec le nom ou le périphérique spécifié
+        self.printer = Printer(backend=backend, device=device)
+        if self.printer.backend is None:
+            self.printer.printer_name = printer_name
+        self.printer_name = self.printer.printer_name
+
+        # Logo en mémoire NV : empreinte détenue par l'imprimante courante
+        self.nv_logos = NvLogoStore(lambda: self.printer.printer_name)
+
+        # Client HTTP vers Odoo (session persistante ouverte dans start())
+        self.odoo_client = OdooClient(odoo_url, log_callback=self._log_fetch)
+
+        # File d'attente d'impression (worker dédié à l'imprimante)
+        self.spooler = PrintSpooler(
+            self.printer,
+            log_callback=log_callback,
+            stats_callback=stats_callback,
+            nv_logos=self.nv_logos,
+            logo_loader=self.odoo_client.fetch_nv_logo,
+        )
+
+        # Messages du POS -> travaux d'impression
+        self.dispatcher = RequestDispatcher(
+            self.spooler, self.odoo_client, log_callback=log_callback
+        )
 
         # boucle et event d'arrêt (initialisés quand start() est lancé)
         self._loop = None
@@ -598,60 +708,19 @@ class PrintAgentGUI_Wrapper:
 
         self.log_callback(f"Initialisation avec imprimante: {printer_name}")
 
-    def get_receipt_from_odoo(self, order_name):
-        """Récupère le ticket depuis Odoo"""
-        import urllib.request
-        import urllib.parse
+    def _log_fetch(self, message, level="info"):
+        """Relaye uniquement les erreurs du client HTTP vers le journal"""
+        if level != "info":
+            self.log_callback(message, level)
 
-        try:
-            encoded_name = urllib.parse.quote(order_name, safe="")
-            url = f"{self.odoo_url}/pos_direct_print/receipt/{encoded_name}"
-
-            self.log_callback(f"Récupération: {order_name}")
-
-            req = urllib.request.Request(url)
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.status == 200:
-                    return response.read()
-                else:
-                    self.log_callback(f"✗ Erreur HTTP: {response.status}", "error")
-                    return None
-
-        except Exception as e:
-            self.log_callback(f"✗ Erreur récupération: {e}", "error")
-            return None
+    async def get_receipt_from_odoo(self, order_name, order_uuid=None):
+        """Récupère le ticket depuis Odoo"""
+        self.log_callback(f"Récupération: {order_name}")
+        return await self.odoo_client.fetch_receipt(order_name, order_uuid)
 
     async def handle_connection(self, websocket):
         """Gère les connexions WebSocket"""
-        import json
-
-        async for message in websocket:
-            try:
-                data = json.loads(message)
-
-                if data.get("type") == "print":
-                    order_name = data.get("order_name")
-                    self.log_callback(f"📥 Demande: {order_name}")
-
-                    receipt_data = self.get_receipt_from_odoo(order_name)
-
-                    if receipt_data:
-                        if self.printer.print_raw(receipt_data):
-                            self.log_callback(f"✓ Imprimé: {order_name}", "success")
-                            self.stats_callback("success")
-                        else:
-                            self.log_callback(
-                                f"✗ Échec impression: {order_name}", "error"
-                            )
-                            self.stats_callback("error")
-                    else:
-                        self.log_callback(
-                            f"✗ Ticket non récupéré: {order_name}", "error"
-                        )
-                        self.stats_callback("error")
-
-            except Exception as e:
-                self.log_callback(f"✗ Erreur: {e}", "error")
+        await self.dispatcher.serve(websocket)
 
     async def start(self):
         """Démarre l'agent"""
@@ -685,6 +754,10 @@ class PrintAgentGUI_Wrapper:
         self._runner = runner
         self._site = site
 
+        # Client HTTP vers Odoo
+        await self.odoo_client.start()
+        self.spooler.start()
+
         # Serveur WebSocket
         # Créer un event d'arrêt pour permettre la fermeture propre depuis un autre thread
         self._stop_event = asyncio.Event()
@@ -711,6 +784,9 @@ class PrintAgentGUI_Wrapper:
             # Arrêter proprement le serveur WebSocket
             server.close()
             await server.wait_closed()
+            await self.spooler.stop()
+            await self.odoo_client.close()
+            self.printer.close()
 
         # Attendre un peu pour que les serveurs se libèrent proprement
         await asyncio.sleep(0.5)
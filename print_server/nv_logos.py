@@ -0,0 +1,51 @@
+# SUIVI DES LOGOS ENREGISTRÉS EN MÉMOIRE NV DES IMPRIMANTES
+
+import json
+
+from .config import NV_LOGOS_FILE
+
+
+class NvLogoStore:
+    """
+    Empreinte du logo que chaque imprimante garde en mémoire NV (GS ( L),
+    enregistrée dans CONFIG_DIR/nv_logos.json : {imprimante: empreinte}.
+
+    Une empreinte n'est retenue qu'une fois imprimé le ticket précédé de la
+    commande d'enregistrement du logo (voir PrintSpooler) : tant que ce
+    n'est pas le cas, le ticket suivant en est précédé à son tour.
+    Supprimer le fichier force un nouvel enregistrement.
+    """
+
+    def __init__(self, printer_key, path=NV_LOGOS_FILE):
+        # printer_key : fonction retournant l'imprimante courante (nom,
+        # périphérique ou adresse), qui peut changer depuis l'interface
+        self.printer_key = printer_key
+        self.path = path
+        self._logos = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                logos = json.load(f)
+            return logos if isinstance(logos, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._logos, f, indent=2)
+        except OSError as e:
+            print(f"⚠️  Suivi des logos NV non enregistré: {e}")
+
+    def holds(self, logo_hash):
+        """Vrai si l'imprimante courante a déjà ce logo en mémoire"""
+        return self._logos.get(str(self.printer_key())) == logo_hash
+
+    def remember(self, logo_hash):
+        """Ticket portant le logo imprimé : l'imprimante courante l'a en mémoire"""
+        key = str(self.printer_key())
+        if self._logos.get(key) != logo_hash:
+            self._logos[key] = logo_hash
+            self._save()
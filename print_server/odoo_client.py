@@ -0,0 +1,319 @@
+# CLIENT HTTP ASYNCHRONE VERS ODOO
+
+import asyncio
+import struct
+import urllib.parse
+
+import aiohttp
+
+try:
+    # aiohttp >= 3.12 : décodage zstd si son module est installé
+    from aiohttp.compression_utils import HAS_ZSTD
+except ImportError:
+    HAS_ZSTD = False
+
+from .config import ODOO_CLIENT_CONFIG
+from .receipt_cache import ReceiptCache
+
+
+# En-tête d'une trame du flux groupé : longueur du nom, longueur du ticket
+_FRAME_HEADER = struct.Struct(">HI")
+
+
+class ReceiptStreamError(Exception):
+    """Réponse interrompue alors qu'une partie du ticket a déjà été produite"""
+
+
+def _print_log(message, level="info"):
+    """Journalisation par défaut (console)"""
+    print(message)
+
+
+def accept_encoding(encodings):
+    """En-tête Accept-Encoding : codages que cette installation sait décoder"""
+    return ", ".join(e for e in encodings if e != "zstd" or HAS_ZSTD)
+
+
+def parse_receipt_stream(payload):
+    """
+    Découpe la réponse de /pos_direct_print/receipts.
+    Retourne un dict {nom de commande: bytes ESC/POS, ou None si absent}.
+    """
+    receipts = {}
+    view = memoryview(payload)
+    offset = 0
+    while offset + _FRAME_HEADER.size <= len(view):
+        name_length, data_length = _FRAME_HEADER.unpack_from(view, offset)
+        offset += _FRAME_HEADER.size
+        name = bytes(view[offset:offset + name_length]).decode("utf-8")
+        offset += name_length
+        data = bytes(view[offset:offset + data_length])
+        offset += data_length
+        receipts[name] = data or None
+    return receipts
+
+
+class OdooClient:
+    """
+    Récupère les tickets ESC/POS depuis Odoo sans bloquer la boucle asyncio.
+
+    Une seule session aiohttp est conservée pour toute la durée de vie de
+    l'agent : les connexions TCP/TLS sont réutilisées (keep-alive) et leur
+    nombre est borné par le pool du connecteur.
+
+    Les tickets récupérés sont gardés dans un cache LRU (`cache`) : une
+    réimpression est revalidée par une requête conditionnelle (ETag).
+
+    Si le ticket appelle un logo en mémoire NV (en-têtes X-Logo-Hash et
+    X-Logo-Url), `on_logo` en est informé ; le spouleur décide d'envoyer
+    la commande d'enregistrement (fetch_nv_logo) juste avant l'impression.
+    """
+
+    def __init__(self, odoo_url, log_callback=None, config=None, cache=None):
+        self.odoo_url = (odoo_url or "").rstrip("/")
+        self.log_callback = log_callback or _print_log
+        self.config = dict(ODOO_CLIENT_CONFIG, **(config or {}))
+        self.cache = cache if cache is not None else ReceiptCache()
+        self._session = None
+
+    async def start(self):
+        """Ouvre la session HTTP (à appeler depuis la boucle de l'agent)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.config["pool_size"],
+                limit_per_host=self.config["pool_size"],
+                keepalive_timeout=self.config["keepalive_timeout"],
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.config["timeout"],
+                connect=self.config["connect_timeout"],
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={
+                    "Accept-Encoding": accept_encoding(self.config["accept_encoding"])
+                },
+            )
+        return self._session
+
+    async def close(self):
+        """Ferme la session et libère les connexions du pool"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def receipt_url(self, order_name, order_uuid=None):
+        """
+        Construit l'URL du ticket pour une commande : par uuid (recherche
+        indexée) si connu, sinon par nom
+        """
+        if order_uuid:
+            encoded_uuid = urllib.parse.quote(order_uuid, safe="")
+            return f"{self.odoo_url}/pos_direct_print/order/uuid/{encoded_uuid}/receipt"
+        encoded_name = urllib.parse.quote(order_name, safe="")
+        return f"{self.odoo_url}/pos_direct_print/receipt/{encoded_name}"
+
+    async def fetch_receipt(self, order_name, order_uuid=None, on_logo=None):
+        """
+        Récupère le ticket formaté (bytes ESC/POS) depuis Odoo.
+        Retourne None en cas d'erreur.
+        """
+        try:
+            chunks = [
+                chunk
+                async for chunk in self.stream_receipt(order_name, order_uuid, on_logo)
+            ]
+        except ReceiptStreamError:
+            return None
+        return b"".join(chunks) or None
+
+    async def stream_receipt(self, order_name, order_uuid=None, on_logo=None):
+        """
+        Récupère le ticket en flux : les morceaux (memoryview) sont produits
+        dès leur réception, sans attendre la fin de la réponse. Le ticket
+        complet est ensuite mis en cache. Ne produit rien en cas d'erreur ;
+        lève ReceiptStreamError si l'erreur survient en cours de réponse.
+        `on_logo(empreinte, url)` est appelé, avant le premier morceau, si le
+        ticket appelle un logo en mémoire NV.
+        """
+        if not self.odoo_url:
+            self.log_callback("✗ URL Odoo non fournie", "error")
+            return
+
+        url = self.receipt_url(order_name, order_uuid)
+        self.log_callback(f"📡 Récupération: {url}")
+
+        cached = self.cache.get(order_name)
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+
+        # La demande peut arriver avant la fin de l'enregistrement de la
+        # commande : un 404 est réessayé quelques fois avec un court délai
+        delay = self.config["not_found_backoff"]
+        attempts = self.config["not_found_retries"] + 1
+        started = False
+        # Le corps est consommé au rythme de l'imprimante : pas de délai
+        # total (qui couperait un long ticket en cours d'impression)
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=self.config["connect_timeout"],
+            sock_read=self.config["read_timeout"],
+        )
+        try:
+            session = await self.start()
+            for attempt in range(attempts):
+                async with session.get(url, headers=headers, timeout=timeout) as response:
+                    if response.status == 304 and cached:
+                        self.log_callback("⤷ Ticket inchangé, copie en cache")
+                        self._announce_logo(response.headers, on_logo)
+                        yield memoryview(cached.data)
+                        return
+                    if response.status == 200:
+                        chunks = []
+                        started = True
+                        self._announce_logo(response.headers, on_logo)
+                        async for chunk in response.content.iter_any():
+                            chunks.append(chunk)
+                            yield memoryview(chunk)
+                        self.cache.put(
+                            order_name, b"".join(chunks), response.headers.get("ETag")
+                        )
+                        return
+                    if response.status != 404 or attempt == attempts - 1:
+                        self.log_callback(
+                            f"✗ Erreur HTTP {response.status}: {response.reason}",
+                            "error",
+                        )
+                        return
+                self.log_callback(
+                    f"⤷ Commande pas encore enregistrée, nouvel essai dans {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.config["not_found_backoff_max"])
+
+        except asyncio.TimeoutError:
+            self.log_callback(f"✗ Délai dépassé: {order_name}", "error")
+            if started:
+                raise ReceiptStreamError(order_name)
+        except aiohttp.ClientError as e:
+            self.log_callback(f"✗ Erreur réseau: {e}", "error")
+            if started:
+                raise ReceiptStreamError(order_name)
+
+    async def fetch_nv_logo(self, logo_url):
+        """
+        Commande d'enregistrement d'un logo en mémoire NV (chemin fourni par
+        l'en-tête X-Logo-Url ou par le POS) ; b"" en cas d'erreur.
+        """
+        # Chemin relatif fourni par Odoo (ou par le POS via print_raw)
+        if not str(logo_url).startswith("/pos_direct_print/"):
+            self.log_callback(f"✗ URL de logo refusée: {logo_url}", "error")
+            return b""
+
+        try:
+            session = await self.start()
+            async with session.get(f"{self.odoo_url}{logo_url}") as response:
+                if response.status == 200:
+                    definition = await response.read()
+                    self.log_callback("📄 Envoi du logo dans la mémoire de l'imprimante")
+                    return definition
+                self.log_callback(
+                    f"✗ Logo non récupéré, HTTP {response.status}: {response.reason}",
+                    "error",
+                )
+        except asyncio.TimeoutError:
+            self.log_callback("✗ Délai dépassé (logo)", "error")
+        except aiohttp.ClientError as e:
+            self.log_callback(f"✗ Erreur réseau (logo): {e}", "error")
+        return b""
+
+    @staticmethod
+    def _announce_logo(headers, on_logo):
+        """Appelle on_logo(empreinte, url) si la réponse désigne un logo NV"""
+        logo_hash = headers.get("X-Logo-Hash")
+        logo_url = headers.get("X-Logo-Url")
+        if on_logo and logo_hash and logo_url:
+            on_logo(logo_hash, logo_url)
+
+    async def reprint_receipt(self, order_name, order_uuid=None, on_logo=None):
+        """
+        Ticket d'une réimpression. La copie en cache est revalidée auprès
+        d'Odoo (If-None-Match) : 304 si la commande n'a pas changé. Une copie
+        sans ETag (demande groupée) est récupérée à nouveau. Si Odoo ne
+        répond pas, la copie en cache est imprimée telle quelle.
+        """
+        cached = self.cache.get(order_name)
+        data = await self.fetch_receipt(order_name, order_uuid, on_logo)
+        if data is None and cached:
+            self.log_callback(
+                f"⚠️ Odoo indisponible, réimpression depuis le cache: {order_name}",
+                "warning",
+            )
+            return cached.data
+        return data
+
+    async def fetch_receipts(self, order_names, on_logo=None):
+        """
+        Récupère plusieurs tickets, par requêtes groupées d'au plus
+        `batch_size` commandes (limite du serveur).
+        Retourne un dict {nom de commande: bytes ou None} ; les commandes
+        d'un lot en erreur sont absentes.
+        `on_logo(nom, empreinte, url)` désigne les tickets qui appellent un
+        logo NV.
+        """
+        if not self.odoo_url:
+            self.log_callback("✗ URL Odoo non fournie", "error")
+            return {}
+
+        order_names = list(order_names)
+        self.log_callback(f"📡 Récupération groupée: {len(order_names)} ticket(s)")
+
+        size = self.config["batch_size"]
+        receipts = {}
+        for start in range(0, len(order_names), size):
+            chunk = await self._fetch_receipt_chunk(order_names[start:start + size])
+            if chunk is None:
+                continue
+            chunk_receipts, headers = chunk
+            if on_logo:
+                for name, data in chunk_receipts.items():
+                    if data:
+                        self._announce_logo(
+                            headers,
+                            lambda logo_hash, logo_url, name=name: on_logo(
+                                name, logo_hash, logo_url
+                            ),
+                        )
+            receipts.update(chunk_receipts)
+        return receipts
+
+    async def _fetch_receipt_chunk(self, order_names):
+        """
+        Une requête groupée : retourne ({nom: bytes ou None}, en-têtes de
+        la réponse), ou None en cas d'erreur
+        """
+        url = f"{self.odoo_url}/pos_direct_print/receipts"
+        try:
+            session = await self.start()
+            timeout = aiohttp.ClientTimeout(total=self.config["batch_timeout"])
+            async with session.post(
+                url, json={"names": order_names}, timeout=timeout
+            ) as response:
+                if response.status == 200:
+                    receipts = parse_receipt_stream(await response.read())
+                    for name, data in receipts.items():
+                        self.cache.put(name, data)
+                    return receipts, response.headers
+                self.log_callback(
+                    f"✗ Erreur HTTP {response.status}: {response.reason}", "error"
+                )
+                return None
+
+        except asyncio.TimeoutError:
+            self.log_callback("✗ Délai dépassé (récupération groupée)", "error")
+            return None
+        except aiohttp.ClientError as e:
+            self.log_callback(f"✗ Erreur réseau: {e}", "error")
+            return None
@@ -1,25 +1,351 @@
 # SERVICE D'IMPRESSION MULTIPLATEFORME
 
+import asyncio
+import codecs
+import functools
+import select
+import signal
+import socket
 import subprocess
 import tempfile
+import threading
+import time
 import os
 import platform
-from .config import ENCODING
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import termios
+except ImportError:  # Windows
+    termios = None
+
+from .config import (
+    ENCODING,
+    PRINT_TIMEOUT,
+    BACKEND_SYSTEM,
+    BACKEND_DEVICE,
+    BACKEND_NETWORK,
+    DEFAULT_DEVICE,
+    DEVICE_CONFIG,
+    NETWORK_CONFIG,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _text_codec(encoding):
+    """
+    Fonction d'encodage du codec (recherche faite une fois par codage), et
+    vrai si encoder des textes d'un bloc donne les mêmes octets que les
+    encoder un à un. Ce n'est pas le cas des codecs à état (BOM, séquences
+    d'échappement) : ils restent encodés morceau par morceau.
+    """
+    encode = codecs.lookup(encoding).encode
+    sample = "aé€アイ Z"
+    whole = encode(sample, "replace")[0]
+    return encode, whole == b"".join(encode(c, "replace")[0] for c in sample)
+
+
+class DeviceBackend:
+    """
+    Écriture directe sur un périphérique caractère (ex: /dev/usb/lp0),
+    sans passer par CUPS.
+
+    Le descripteur de fichier reste ouvert entre les tickets ; il est
+    rouvert automatiquement après une erreur (imprimante débranchée...).
+    Il est ouvert en mode non bloquant : une imprimante bloquée (plus de
+    papier, capot ouvert) fait échouer l'écriture après `send_budget`
+    secondes au lieu de la laisser en attente dans le thread d'envoi.
+    """
+
+    def __init__(self, path, config=None):
+        self.path = path
+        self.config = dict(DEVICE_CONFIG, **(config or {}))
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """Ouvre le périphérique si nécessaire"""
+        if self._fd is None:
+            flags = (
+                os.O_WRONLY
+                | getattr(os, "O_NOCTTY", 0)
+                | getattr(os, "O_BINARY", 0)
+                | getattr(os, "O_NONBLOCK", 0)  # Windows : écriture bloquante
+            )
+            self._fd = os.open(self.path, flags)
+        return self._fd
+
+    def close(self):
+        """Ferme le périphérique"""
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def send(self, data):
+        """
+        Envoie un travail complet en au plus `send_budget` secondes. Une
+        nouvelle tentative après réouverture seulement si aucun octet n'a été
+        écrit : renvoyer un ticket commencé en imprimerait le début deux fois.
+        """
+        with self._lock:
+            if not self._write(data, retry=True):
+                return False
+            self._flush(self._fd)
+        return True
+
+    def write(self, data, retry=False):
+        """
+        Écrit un morceau de ticket (envoi en flux). `retry` : rien n'a encore
+        été envoyé pour ce ticket, une réouverture peut donc être tentée.
+        """
+        with self._lock:
+            return self._write(data, retry)
+
+    def _write(self, data, retry):
+        """Écrit data (appelant verrouillé), réouverture si rien n'est parti"""
+        deadline = time.monotonic() + self.config["send_budget"]
+        for _ in range(2 if retry else 1):
+            try:
+                fd = self._open()
+            except OSError as e:
+                error = e
+                continue
+            written, error = self._write_all(fd, data, deadline)
+            if error is None:
+                return True
+            self.close()
+            if written:
+                break
+        print(f"✗ Erreur périphérique {self.path}: {error}")
+        return False
+
+    def flush(self):
+        """Fin d'un ticket envoyé en flux"""
+        with self._lock:
+            if self._fd is not None:
+                self._flush(self._fd)
+        return True
+
+    @staticmethod
+    def _write_all(fd, data, deadline):
+        """
+        Écrit toutes les données avant `deadline` (os.write peut être
+        partiel, ou refusé tant que l'imprimante n'accepte rien).
+        Retourne (octets écrits, erreur ou None).
+        """
+        view = memoryview(data)
+        written = 0
+        try:
+            while view:
+                try:
+                    count = os.write(fd, view)
+                except BlockingIOError:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not select.select([], [fd], [], remaining)[1]:
+                        raise TimeoutError("délai d'écriture dépassé") from None
+                    continue
+                written += count
+                view = view[count:]
+        except OSError as e:
+            return written, e
+        return written, None
+
+    @staticmethod
+    def _flush(fd):
+        """Fin de travail : attend que le pilote ait transmis les données"""
+        if termios is None:
+            return
+        try:
+            termios.tcdrain(fd)
+        except (termios.error, OSError):
+            # Pas un terminal (ex: /dev/usb/lp0) : os.write n'a pas de tampon
+            pass
+
+
+class NetworkBackend:
+    """
+    Imprimante Ethernet en TCP brut (port 9100 / JetDirect), sans CUPS.
+
+    Une seule connexion persistante (keep-alive) est gardée par imprimante :
+    les travaux successifs sont envoyés à la suite sur le même socket, et la
+    connexion est rétablie avec un délai croissant après une coupure.
+    """
+
+    def __init__(self, address, config=None):
+        self.config = dict(NETWORK_CONFIG, **(config or {}))
+        host, _, port = address.strip().rpartition(":")
+        if not host or not port.isdigit():
+            host, port = address.strip(), self.config["port"]
+        self.host = host
+        self.port = int(port)
+        self._sock = None
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def _connect(self):
+        """Ouvre la connexion si nécessaire"""
+        if self._sock is not None and self._is_stale(self._sock):
+            self.close()
+        if self._sock is None:
+            sock = socket.create_connection(
+                (self.host, self.port), timeout=self.config["connect_timeout"]
+            )
+            self._configure(sock)
+            self._sock = sock
+        return self._sock
+
+    def _configure(self, sock):
+        """Keep-alive TCP, envoi immédiat et délai d'écriture"""
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        idle = self.config["keepalive_idle"]
+        for option, value in (
+            ("TCP_KEEPIDLE", idle),
+            ("TCP_KEEPINTVL", max(1, idle // 3)),
+            ("TCP_KEEPCNT", 3),
+        ):
+            if hasattr(socket, option):
+                try:
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+                except OSError:
+                    pass
+        sock.settimeout(self.config["write_timeout"])
+
+    @staticmethod
+    def _is_stale(sock):
+        """
+        Vrai si l'imprimante a fermé la connexion. Les octets d'état
+        éventuellement renvoyés par l'imprimante sont ignorés.
+        """
+        try:
+            while select.select([sock], [], [], 0)[0]:
+                if not sock.recv(4096):
+                    return True
+        except (OSError, ValueError):
+            return True
+        return False
+
+    def close(self):
+        """Ferme la connexion"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def send(self, data):
+        """
+        Envoie un travail sur la connexion persistante. Reconnexion avec un
+        délai croissant tant qu'aucun octet n'est parti et que le budget
+        `send_budget` le permet (inférieur à PRINT_TIMEOUT : le spouleur
+        n'abandonne pas un envoi qui continue en arrière-plan). Un ticket
+        commencé n'est jamais renvoyé : son début serait imprimé deux fois.
+        """
+        deadline = time.monotonic() + self.config["send_budget"]
+        delay = self.config["backoff"]
+        attempts = max(1, self.config["retries"])
+        with self._lock:
+            for attempt in range(attempts):
+                sent = 0
+                try:
+                    sock = self._connect()
+                    sent, error = self._send_all(sock, data, deadline)
+                except OSError as e:
+                    error = e
+                if error is None:
+                    return True
+                self.close()
+                retry_at = time.monotonic() + delay
+                if (
+                    sent
+                    or attempt == attempts - 1
+                    or retry_at + self.config["connect_timeout"] > deadline
+                ):
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, self.config["backoff_max"])
+            print(f"✗ Erreur imprimante réseau {self.address}: {error}")
+        return False
+
+    def _send_all(self, sock, data, deadline):
+        """
+        Envoie toutes les données avant `deadline` (send peut être partiel).
+        Retourne (octets envoyés, erreur ou None).
+        """
+        view = memoryview(data)
+        sent = 0
+        try:
+            while view:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("délai d'envoi dépassé")
+                sock.settimeout(min(remaining, self.config["write_timeout"]))
+                count = sock.send(view)
+                sent += count
+                view = view[count:]
+        except OSError as e:
+            return sent, e
+        finally:
+            sock.settimeout(self.config["write_timeout"])
+        return sent, None
+
+    def write(self, data, retry=False):
+        """
+        Écrit un morceau de ticket (envoi en flux). Reconnexion seulement
+        pour le premier morceau (`retry`) : au-delà, le ticket serait tronqué.
+        """
+        if retry:
+            return self.send(data)
+        with self._lock:
+            try:
+                self._connect().sendall(data)
+                return True
+            except OSError as e:
+                self.close()
+                print(f"✗ Erreur imprimante réseau {self.address}: {e}")
+        return False
+
+    def flush(self):
+        """Fin d'un ticket envoyé en flux (sendall a déjà tout transmis)"""
+        return True
 
 
 class Printer:
     """Gère l'impression via CUPS (Linux) ou impression directe (Windows)"""
 
-    def __init__(self, encoding = ENCODING):
+    def __init__(self, encoding = ENCODING, backend = BACKEND_SYSTEM, device = None):
         """
         Initialise l'imprimante.
         
         Args:
             encoding: Encodage des caractères (cp437 par défaut)
+            backend: Mode de connexion ("system", "device" ou "network")
+            device: Chemin du périphérique (mode "device") ou adresse
+                hôte[:port] de l'imprimante (mode "network")
         """
         self.printer_name = None
         self.encoding = encoding
         self.os_type = platform.system()
+        self._executor = None  # Pool de threads dédié (créé à la demande)
+        self.backend = None  # None = CUPS / spouleur Windows
+
+        if backend == BACKEND_DEVICE:
+            self.backend = DeviceBackend(device or DEFAULT_DEVICE)
+            self.printer_name = self.backend.path
+            return
+        if backend == BACKEND_NETWORK:
+            if not device:
+                raise ValueError("Adresse de l'imprimante réseau manquante")
+            self.backend = NetworkBackend(device)
+            self.printer_name = self.backend.address
+            return
 
         # Tentative de détection automatique de l'imprimante par défaut
         try:
@@ -62,8 +388,85 @@ class Printer:
             print(f"✗ Erreur print_raw: {e}")
             return False
 
+    async def print_raw_async(self, data):
+        """
+        Version asynchrone de print_raw : l'envoi se fait hors de la boucle
+        asyncio, avec son propre délai maximal (PRINT_TIMEOUT).
+        """
+        try:
+            if isinstance(data, str):
+                data = data.encode(self.encoding, errors="replace")
+            if self.backend is not None:
+                return await self._run_in_executor(self.backend.send, data)
+            if self.os_type == "Windows":
+                return await self._run_in_executor(self._print_windows, data)
+            return await self._print_unix_async(data)
+        except Exception as e:
+            print(f"✗ Erreur print_raw_async: {e}")
+            return False
+
+    @property
+    def supports_streaming(self):
+        """Envoi en flux possible : périphérique direct ou imprimante réseau"""
+        return self.backend is not None
+
+    async def print_stream_async(self, chunks):
+        """
+        Transmet un ticket à l'imprimante au fur et à mesure de sa réception
+        (itérable asynchrone de bytes / memoryview, sans concaténation).
+        Retourne le nombre d'octets envoyés, 0 en cas d'échec.
+        """
+        sent = 0
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if not await self._run_in_executor(
+                    self.backend.write, chunk, sent == 0
+                ):
+                    return 0
+                sent += len(chunk)
+            if sent and not await self._run_in_executor(self.backend.flush):
+                return 0
+            return sent
+        except Exception as e:
+            print(f"✗ Erreur print_stream_async: {e}")
+            return 0
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def _run_in_executor(self, func, *args):
+        """Exécute un envoi bloquant dans le pool de threads de l'imprimante"""
+        if self._executor is None:
+            # Un seul thread : les travaux d'une imprimante restent séquentiels
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="printer"
+            )
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, func, *args)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), PRINT_TIMEOUT)
+        except asyncio.TimeoutError:
+            # L'écriture continue dans le thread : annoncer un échec alors
+            # que le ticket peut encore s'imprimer provoquerait un doublon.
+            # Les modes device et réseau s'arrêtent d'eux-mêmes avant ce délai.
+            print(f"⚠️ Envoi plus long que {PRINT_TIMEOUT}s, attente de sa fin")
+            return await future
+
+    def close(self):
+        """Libère le périphérique et le pool de threads"""
+        if self.backend is not None:
+            self.backend.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
     def _send_to_printer(self, data):
-        """Envoie les données à l'imprimante selon l'OS"""
+        """Envoie les données à l'imprimante selon le mode de connexion"""
+        if self.backend is not None:
+            return self.backend.send(data)
         if self.os_type == "Windows":
             return self._print_windows(data)
         else:
@@ -74,17 +477,17 @@ class Printer:
         temp_file = None
         
         try:
-            # Créer un fichier temporaire
+            # Méthode 1: Essayer win32print (le plus fiable pour données brutes)
+            if self._try_win32print(data):
+                return True
+
+            # Fichier temporaire créé seulement pour les méthodes qui l'exigent
             with tempfile.NamedTemporaryFile(
                 mode="wb", delete=False, suffix=".prn"
             ) as f:
                 f.write(data)
                 temp_file = f.name
 
-            # Méthode 1: Essayer win32print (le plus fiable pour données brutes)
-            if self._try_win32print(data):
-                return True
-
             # Méthode 2: Copie binaire directe (pour ESC/POS)
             if self._try_copy_binary(temp_file):
                 return True
@@ -206,8 +609,36 @@ class Printer:
             print(f"   ⤷ Port direct échoué: {e}")
             return False
 
+    def _lp_command(self, *files):
+        """Commande lp d'envoi brut (sans fichier : lecture sur stdin)"""
+        return ["lp", "-d", self.printer_name, "-o", "raw", *files]
+
     def _print_unix(self, data):
-        """Impression sur Linux/Unix via CUPS"""
+        """Impression sur Linux/Unix via CUPS (données envoyées sur le stdin de lp)"""
+        try:
+            subprocess.run(
+                self._lp_command(),
+                input=data,
+                check=True,
+                capture_output=True,
+                timeout=PRINT_TIMEOUT
+            )
+            print(f"   ✓ Impression réussie (CUPS)")
+            return True
+
+        except FileNotFoundError:
+            print(f"✗ CUPS non installé. Installer avec: sudo apt-get install cups")
+            return False
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode(errors="replace").strip() if e.stderr else e
+            print(f"   ⤷ lp (stdin) échoué: {stderr}")
+            return self._print_unix_file(data)
+        except Exception as e:
+            print(f"✗ Erreur impression Unix: {e}")
+            return False
+
+    def _print_unix_file(self, data):
+        """Impression CUPS via un fichier temporaire (solution de repli)"""
         temp_file = None
         
         try:
@@ -218,13 +649,13 @@ class Printer:
                 temp_file = f.name
 
             result = subprocess.run(
-                ["lp", "-d", self.printer_name, "-o", "raw", temp_file],
+                self._lp_command(temp_file),
                 check=True,
                 capture_output=True,
                 text=True,
-                timeout=10
+                timeout=PRINT_TIMEOUT
             )
-            print(f"   ✓ Impression réussie (CUPS)")
+            print(f"   ✓ Impression réussie (CUPS, fichier)")
             return True
 
         except FileNotFoundError:
@@ -243,26 +674,103 @@ class Printer:
                 except:
                     pass
 
+    async def _print_unix_async(self, data):
+        """Impression Linux/Unix via CUPS sans bloquer la boucle asyncio"""
+        result = await self._run_lp_async(data)
+        if result is None:
+            # lp a refusé le flux stdin : repli sur le fichier temporaire
+            return await self._run_in_executor(self._print_unix_file, data)
+        return result
+
+    async def _run_lp_async(self, data):
+        """
+        Envoie les données sur le stdin de lp.
+        Retourne True/False, ou None si lp a échoué (repli possible).
+        """
+        process = None
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self._lp_command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,  # lp et ses fils arrêtés ensemble
+            )
+            _, stderr = await asyncio.wait_for(
+                process.communicate(data), PRINT_TIMEOUT
+            )
+
+            if process.returncode != 0:
+                print(f"   ⤷ lp (stdin) échoué: {stderr.decode(errors='replace').strip()}")
+                return None
+            print(f"   ✓ Impression réussie (CUPS)")
+            return True
+
+        except FileNotFoundError:
+            print(f"✗ CUPS non installé. Installer avec: sudo apt-get install cups")
+            return False
+        except asyncio.TimeoutError:
+            print(f"✗ Délai d'impression CUPS dépassé ({PRINT_TIMEOUT}s)")
+            return False
+        except Exception as e:
+            print(f"✗ Erreur impression Unix: {e}")
+            return False
+        finally:
+            # Délai dépassé ou envoi annulé : comme subprocess.run, arrêter
+            # lp et attendre sa fin (pas de processus zombie, tubes fermés)
+            if process is not None and process.returncode is None:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+
     def _encode_content(self, content):
         """
-        Encode le contenu pour l'imprimante en préservant les commandes ESC/POS
+        Encode le contenu pour l'imprimante en préservant les commandes ESC/POS.
+
+        `content` : texte, bytes, ou suite de morceaux (str, bytes, octets
+        int). Les morceaux str consécutifs sont encodés en un seul appel.
         """
-        result = bytearray()
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        if isinstance(content, str):
+            # Équivaut à encoder le texte caractère par caractère
+            return self._encode_text(content) if content else b""
 
-        for char in content:
-            if isinstance(char, bytes):
-                result.extend(char)
+        result = bytearray()
+        run = []  # Morceaux str en attente d'encodage
+
+        for item in content:
+            if isinstance(item, str):
+                run.append(item)
+                continue
+            if run:
+                result.extend(self._encode_text(run))
+                run.clear()
+            if isinstance(item, bytes):
+                result.extend(item)
+            elif isinstance(item, int):
+                result.append(item)  # ValueError au-delà de 255
             else:
                 try:
-                    result.extend(char.encode(self.encoding, errors="replace"))
+                    result.extend(item.encode(self.encoding, errors="replace"))
                 except (UnicodeEncodeError, AttributeError):
-                    if isinstance(char, int):
-                        result.append(char)
-                    else:
-                        result.extend(str(char).encode(self.encoding, errors="replace"))
+                    result.extend(str(item).encode(self.encoding, errors="replace"))
+        if run:
+            result.extend(self._encode_text(run))
 
         return bytes(result)
 
+    def _encode_text(self, pieces):
+        """Encode une suite de textes (ou les caractères d'un texte)"""
+        encode, bulk = _text_codec(self.encoding)
+        if bulk:
+            text = pieces if isinstance(pieces, str) else "".join(pieces)
+            return encode(text, "replace")[0]
+        return b"".join(encode(piece, "replace")[0] for piece in pieces)
+
     @staticmethod
     def list_printers():
         """Liste les imprimantes disponibles sur le système"""
@@ -0,0 +1,58 @@
+# CACHE DES TICKETS RÉCEMMENT IMPRIMÉS (RÉIMPRESSIONS)
+
+from collections import OrderedDict, namedtuple
+
+from .config import RECEIPT_CACHE_CONFIG
+
+
+# Ticket mis en cache : bytes ESC/POS et ETag renvoyé par Odoo (ou None)
+CachedReceipt = namedtuple("CachedReceipt", ["data", "etag"])
+
+
+class ReceiptCache:
+    """
+    Cache LRU en mémoire des tickets, indexé par nom de commande.
+
+    Borné à la fois en nombre d'entrées et en octets : les tickets les moins
+    récemment utilisés sont évincés en premier.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries or RECEIPT_CACHE_CONFIG["max_entries"]
+        self.max_bytes = max_bytes or RECEIPT_CACHE_CONFIG["max_bytes"]
+        self._entries = OrderedDict()
+        self.size = 0  # Octets occupés
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, order_name):
+        return order_name in self._entries
+
+    def get(self, order_name):
+        """Retourne le CachedReceipt de la commande (ou None)"""
+        entry = self._entries.get(order_name)
+        if entry is not None:
+            self._entries.move_to_end(order_name)
+        return entry
+
+    def put(self, order_name, data, etag=None):
+        """Ajoute (ou remplace) le ticket d'une commande"""
+        if not data or len(data) > self.max_bytes:
+            return
+        self.discard(order_name)
+        self._entries[order_name] = CachedReceipt(bytes(data), etag)
+        self.size += len(data)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.data)
+
+    def discard(self, order_name):
+        """Retire une commande du cache"""
+        entry = self._entries.pop(order_name, None)
+        if entry is not None:
+            self.size -= len(entry.data)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
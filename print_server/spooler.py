@@ -0,0 +1,327 @@
+# FILE D'ATTENTE D'IMPRESSION (SPOOLER)
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import uuid
+
+# Statuts d'un travail d'impression (renvoyés au POS)
+JOB_QUEUED = "queued"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+def _print_log(message, level="info"):
+    """Journalisation par défaut (console)"""
+    print(message)
+
+
+def decode_raw_payload(message):
+    """
+    Décode le ticket d'un message print_raw (base64) et vérifie son
+    empreinte SHA-256 lorsqu'elle est fournie. Lève ValueError sinon.
+    """
+    try:
+        data = base64.b64decode(message.get("data") or "", validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Contenu base64 invalide")
+    if not data:
+        raise ValueError("Ticket vide")
+
+    expected = message.get("sha256")
+    if expected and hashlib.sha256(data).hexdigest() != str(expected).lower():
+        raise ValueError("Empreinte SHA-256 invalide")
+    return data
+
+
+class PrintJob:
+    """
+    Travail d'impression : un ticket à récupérer puis à imprimer.
+
+    Le contenu est soit fourni directement (`data`), soit obtenu par la
+    coroutine `fetch` lancée dès la mise en file, pour que la récupération
+    du ticket suivant chevauche l'impression du ticket en cours.
+
+    `stream` (facultatif) retourne un itérable asynchrone des morceaux du
+    ticket : si l'imprimante est libre, il est transmis au fur et à mesure
+    de sa réception au lieu d'être récupéré en entier avant impression.
+
+    `deferred` : récupération lancée seulement quand le worker atteint le
+    travail (réimpression : la copie mise en cache par un ticket précédent
+    de la file est alors revalidée au lieu d'être récupérée en parallèle).
+
+    `nv_logo` : (empreinte, URL) du logo en mémoire NV appelé par le
+    ticket (voir uses_logo). Le worker décide juste avant l'envoi s'il faut
+    d'abord enregistrer ce logo dans l'imprimante (`logo_sent`).
+    """
+
+    def __init__(self, order_name, fetch=None, data=None, notify=None,
+                 request_id=None, stream=None, deferred=False):
+        self.id = uuid.uuid4().hex
+        self.order_name = order_name
+        # Identifiant fourni par le POS, renvoyé tel quel dans les accusés
+        self.request_id = request_id
+        self.status = None
+        self.error = None
+        self.streaming = False  # Choisi à la mise en file (voir PrintSpooler)
+        self.deferred = deferred
+        self.nv_logo = None
+        self.logo_sent = None
+        self._fetch = fetch
+        self._stream = stream
+        self._data = data
+        self._notify = notify
+        self._payload_task = None
+
+    def uses_logo(self, logo_hash, logo_url):
+        """Le ticket appelle ce logo en mémoire NV (en-têtes X-Logo-*)"""
+        if logo_hash and logo_url:
+            self.nv_logo = (logo_hash, logo_url)
+
+    def prefetch(self):
+        """Lance la récupération du ticket en tâche de fond (sauf si différée)"""
+        if not self.deferred:
+            self._start_fetch()
+
+    def _start_fetch(self):
+        if self._data is None and self._fetch and self._payload_task is None:
+            self._payload_task = asyncio.ensure_future(self._fetch())
+
+    async def payload(self):
+        """Retourne les bytes ESC/POS du ticket (None si indisponible)"""
+        if self._data is not None:
+            return self._data
+        self._start_fetch()
+        if self._payload_task is None:
+            return None
+        return await self._payload_task
+
+    def can_stream(self):
+        """Vrai si le ticket peut être transmis en flux"""
+        return self._data is None and self._stream is not None
+
+    def open_stream(self):
+        """Itérable asynchrone des morceaux du ticket"""
+        return self._stream()
+
+    def cancel(self):
+        """Annule une récupération encore en cours"""
+        if self._payload_task and not self._payload_task.done():
+            self._payload_task.cancel()
+
+    def to_message(self):
+        """Accusé de réception envoyé au POS"""
+        message = {
+            "type": "job",
+            "job_id": self.id,
+            "order_name": self.order_name,
+            "status": self.status,
+        }
+        if self.request_id is not None:
+            message["request_id"] = self.request_id
+        if self.error:
+            message["error"] = self.error
+        return message
+
+    async def set_status(self, status, error=None):
+        """Met à jour le statut et prévient l'émetteur de la demande"""
+        self.status = status
+        self.error = error
+        if self._notify:
+            try:
+                await self._notify(self)
+            except Exception:
+                # Le POS a pu fermer sa connexion : l'impression continue
+                pass
+
+
+class PrintSpooler:
+    """
+    File d'attente asynchrone drainée par un worker dédié à une imprimante.
+
+    Logo en mémoire NV : `nv_logos` suit le logo détenu par l'imprimante et
+    `logo_loader(url)` télécharge sa commande d'enregistrement. Le worker
+    l'envoie avant le premier ticket qui appelle un logo absent, puis le
+    retient une fois ce ticket imprimé : un seul enregistrement par logo et
+    par imprimante, même pour des tickets récupérés en même temps.
+    """
+
+    def __init__(self, printer, log_callback=None, stats_callback=None,
+                 nv_logos=None, logo_loader=None):
+        self.printer = printer
+        self.log_callback = log_callback or _print_log
+        self.stats_callback = stats_callback
+        self.nv_logos = nv_logos
+        self.logo_loader = logo_loader
+        self.queue = None
+        self._worker = None
+        self._busy = False
+
+    def start(self):
+        """Crée la file et démarre le worker (dans la boucle de l'agent)"""
+        if self._worker is None:
+            self.queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Arrête le worker et abandonne les travaux en attente"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            job.cancel()
+            self.queue.task_done()
+
+    async def submit(self, job):
+        """Met un travail en file et acquitte immédiatement sa réception"""
+        self.start()
+        # Imprimante libre : le ticket part en flux dès sa réception.
+        # Sinon, récupération anticipée pendant l'impression en cours.
+        job.streaming = (
+            job.can_stream()
+            and getattr(self.printer, "supports_streaming", False)
+            and not self._busy
+            and self.queue.empty()
+        )
+        if not job.streaming:
+            job.prefetch()
+        await job.set_status(JOB_QUEUED)
+        await self.queue.put(job)
+        return job
+
+    async def submit_batch(self, order_names, fetch_many, notify=None,
+                           request_id=None):
+        """
+        Met en file plusieurs tickets récupérés par une seule requête
+        (`fetch_many(noms, on_logo)` retourne un dict {nom: bytes} et appelle
+        on_logo(nom, empreinte, url) pour les tickets qui appellent un logo
+        NV). Chaque ticket reste un travail distinct, acquitté séparément.
+        """
+
+        async def fetch_one(name):
+            # shield : annuler un travail ne doit pas annuler tout le lot
+            receipts = await asyncio.shield(batch)
+            return receipts.get(name)
+
+        jobs = [
+            PrintJob(
+                name,
+                fetch=lambda n=name: fetch_one(n),
+                notify=notify,
+                request_id=request_id,
+            )
+            for name in order_names
+        ]
+        jobs_by_name = {}
+        for job in jobs:
+            jobs_by_name.setdefault(job.order_name, []).append(job)
+
+        def on_logo(name, logo_hash, logo_url):
+            for job in jobs_by_name.get(name, ()):
+                job.uses_logo(logo_hash, logo_url)
+
+        batch = asyncio.ensure_future(fetch_many(order_names, on_logo))
+        for job in jobs:
+            await self.submit(job)
+        return jobs
+
+    async def reject(self, job, reason):
+        """Refuse un travail sans le mettre en file (demande invalide)"""
+        await self._fail(job, reason)
+        return job
+
+    async def _run(self):
+        """Boucle du worker : imprime les travaux dans l'ordre d'arrivée"""
+        while True:
+            job = await self.queue.get()
+            self._busy = True
+            try:
+                await self._process(job)
+            except Exception as e:
+                await self._fail(job, f"Erreur: {e}")
+            finally:
+                self._busy = False
+                self.queue.task_done()
+
+    async def _process(self, job):
+        """Récupère puis imprime un travail"""
+        if job.streaming:
+            await self._process_stream(job)
+            return
+
+        data = await job.payload()
+        if not data:
+            await self._fail(job, f"Ticket non récupéré: {job.order_name}")
+            return
+
+        logo = await self._logo_definition(job)
+        if await self.printer.print_raw_async(logo + data if logo else data):
+            await self._done(job)
+        else:
+            await self._fail(job, f"Échec d'impression: {job.order_name}")
+
+    async def _process_stream(self, job):
+        """Imprime un travail au fur et à mesure de sa récupération"""
+        chunks = self._stream_with_logo(job, job.open_stream())
+        if await self.printer.print_stream_async(chunks):
+            await self._done(job)
+        else:
+            await self._fail(job, f"Ticket non récupéré ou échec d'impression: {job.order_name}")
+
+    async def _stream_with_logo(self, job, chunks):
+        """
+        Morceaux du ticket, précédés si besoin de l'enregistrement du logo :
+        le logo appelé est connu dès les en-têtes, avant le premier morceau.
+        """
+        first = True
+        try:
+            async for chunk in chunks:
+                if first:
+                    first = False
+                    logo = await self._logo_definition(job)
+                    if logo:
+                        yield memoryview(logo)
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def _logo_definition(self, job):
+        """
+        Commande d'enregistrement du logo appelé par le ticket si
+        l'imprimante ne l'a pas encore, b"" sinon. Appelée par le worker
+        juste avant l'envoi du ticket. En cas d'erreur, le ticket s'imprime
+        sans logo (nouvel essai au ticket suivant).
+        """
+        if not (job.nv_logo and self.nv_logos and self.logo_loader):
+            return b""
+        logo_hash, logo_url = job.nv_logo
+        if self.nv_logos.holds(logo_hash):
+            return b""
+        definition = await self.logo_loader(logo_url)
+        if definition:
+            job.logo_sent = logo_hash
+        return definition
+
+    async def _done(self, job):
+        """Marque un travail imprimé"""
+        self.log_callback(f"✓ Ticket imprimé: {job.order_name}", "success")
+        if job.logo_sent and self.nv_logos:
+            self.nv_logos.remember(job.logo_sent)
+        if self.stats_callback:
+            self.stats_callback("success")
+        await job.set_status(JOB_DONE)
+
+    async def _fail(self, job, reason):
+        """Marque un travail en échec"""
+        self.log_callback(f"✗ {reason}", "error")
+        if self.stats_callback:
+            self.stats_callback("error")
+        await job.set_status(JOB_FAILED, reason)